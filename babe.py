@@ -0,0 +1,247 @@
+"""
+Single entry point for the gap, stats, plotting and live display tools.
+
+    python babe.py gaps AU2412 --latest   # last computed gap, no pandas import
+    python babe.py gaps AU2412 GCM24E.CMX # recompute gaps
+    python babe.py stats
+    python babe.py plot AU2412
+    python babe.py run -j 4               # incremental pipeline, see pipeline.py
+    python babe.py serve --port 8765
+    python babe.py profile --by weekday_minute  # see seasonality.py
+    python babe.py live
+    python babe.py replay market_data_2024-11-01_night.csv
+
+Only the standard library is imported at startup; pandas, scipy, matplotlib,
+PyQt5 and WindPy are imported by the subcommand that needs them.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+_start = time.perf_counter()
+
+# Wall time from loading babe.py to the answer of a quick query
+# (e.g. `gaps AU2412 --latest`); checked by --time
+STARTUP_BUDGET_MS = 300
+
+
+def _contracts(names, data_dir="data"):
+    if names:
+        return names
+    files = glob.glob(os.path.join(data_dir, "AU*.csv")) + glob.glob(
+        os.path.join(data_dir, "GC*.csv")
+    )
+    return sorted(os.path.basename(f).replace(".csv", "") for f in files)
+
+
+def _gap_file(contract):
+    return f"results/price_gaps_{contract}.csv"
+
+
+def read_latest_row(file_path):
+    """
+    Return the header and last row of a CSV file as a dictionary, reading only
+    the end of the file.
+    """
+    with open(file_path, "rb") as f:
+        header = f.readline().decode().strip().split(",")
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        block = 4096
+        data = b""
+        lines = []
+        while size > 0:
+            step = min(block, size)
+            size -= step
+            f.seek(size)
+            data = f.read(step) + data
+            lines = data.strip().splitlines()
+            if len(lines) > 1 or size == 0:
+                break
+    if not lines:
+        return None
+    last = lines[-1].decode().strip().split(",")
+    if last == header:
+        return None
+    return dict(zip(header, last))
+
+
+def cmd_gaps(args):
+    if args.latest:
+        contracts = args.contracts or [
+            os.path.basename(f).replace("price_gaps_", "").replace(".csv", "")
+            for f in sorted(glob.glob(_gap_file("*")))
+        ]
+        for contract in contracts:
+            if not os.path.exists(_gap_file(contract)):
+                print(f"{contract}: no results, run `babe.py gaps {contract}` first")
+                continue
+            row = read_latest_row(_gap_file(contract))
+            if row is None:
+                print(f"{contract}: no gaps")
+                continue
+            values = "  ".join(f"{k}={v}" for k, v in row.items() if k != "DateTime")
+            print(f"{contract}  {row.get('DateTime')}  {values}")
+        return 0
+
+    from cal_gap import calculate_gap, calculate_gc_gap
+
+    for contract in _contracts(args.contracts):
+        calculate = calculate_gc_gap if contract.startswith("GC") else calculate_gap
+        gaps = calculate(contract)
+        print(f"{contract}: {len(gaps)} gaps saved to '{_gap_file(contract)}'")
+    return 0
+
+
+def cmd_stats(args):
+    import t_test
+
+    if not args.contracts:
+        t_test.main()
+        return 0
+
+    import pandas as pd
+
+    results = [t_test.perform_t_test(_gap_file(c)) for c in args.contracts]
+    t_test.print_results_table(pd.DataFrame(results))
+    return 0
+
+
+def cmd_plot(args):
+    from plot import plot_gaps
+
+    gap_files = (
+        [_gap_file(c) for c in args.contracts]
+        if args.contracts
+        else sorted(glob.glob(_gap_file("*")))
+    )
+    for file_path in gap_files:
+        plot_gaps(file_path)
+        print(f"Plot created for {file_path}")
+    return 0
+
+
+def cmd_run(args):
+    import pipeline
+
+    return pipeline.main(args.pipeline_args)
+
+
+def cmd_serve(args):
+    import server
+
+    return server.main(["serve", *args.pipeline_args])
+
+
+def cmd_profile(args):
+    import seasonality
+
+    return seasonality.main(args.pipeline_args)
+
+
+def cmd_live(args):
+    import demo
+
+    return demo.main()
+
+
+def cmd_replay(args):
+    import demo
+
+    return demo.replay(args.file, interval=args.interval)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="babe", description="Gold price gap analysis tools"
+    )
+    # A plain flag, so `--profile gaps ...` does not swallow the subcommand
+    parser.add_argument(
+        "--profile", action="store_true", help="Record a profile, see profiling.py"
+    )
+    parser.add_argument(
+        "--profile-options",
+        default=None,
+        metavar="OPTIONS",
+        help="Profiling options, e.g. memory,cprofile (implies --profile)",
+    )
+    parser.add_argument(
+        "--time",
+        action="store_true",
+        help="Report the wall time (checked against the budget for --latest)",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gaps = sub.add_parser("gaps", help="Calculate price gaps or show the latest")
+    gaps.add_argument("contracts", nargs="*", help="e.g. AU2412 GCM24E.CMX")
+    gaps.add_argument(
+        "--latest",
+        action="store_true",
+        help="Print the last computed gap instead of recalculating",
+    )
+    gaps.set_defaults(func=cmd_gaps)
+
+    stats = sub.add_parser("stats", help="t-test gap = 0 for each contract")
+    stats.add_argument("contracts", nargs="*")
+    stats.set_defaults(func=cmd_stats)
+
+    plot = sub.add_parser("plot", help="Plot price gaps")
+    plot.add_argument("contracts", nargs="*")
+    plot.set_defaults(func=cmd_plot)
+
+    # Remaining arguments of `run`, `serve` and `profile` are passed on to
+    # pipeline.py, server.py and seasonality.py
+    run = sub.add_parser(
+        "run", help="Rebuild stale gaps, stats and figures (pipeline.py options)"
+    )
+    run.set_defaults(func=cmd_run)
+
+    serve = sub.add_parser("serve", help="Local gap query service (server.py options)")
+    serve.set_defaults(func=cmd_serve)
+
+    profile = sub.add_parser(
+        "profile",
+        help="Gap profiles by minute, session or weekday (seasonality.py options)",
+    )
+    profile.set_defaults(func=cmd_profile)
+
+    live = sub.add_parser("live", help="Real-time market data display (WindPy)")
+    live.set_defaults(func=cmd_live)
+
+    replay = sub.add_parser("replay", help="Replay a saved market data file")
+    replay.add_argument("file")
+    replay.add_argument(
+        "--interval", type=int, default=1000, help="Milliseconds between rows"
+    )
+    replay.set_defaults(func=cmd_replay)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command not in ("run", "serve", "profile"):
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.pipeline_args = extra
+    if args.profile or args.profile_options:
+        from profiling import enable
+
+        enable(args.profile_options or "trace", run_name=f"babe_{args.command}")
+
+    status = args.func(args)
+
+    if args.time:
+        elapsed_ms = (time.perf_counter() - _start) * 1000
+        message = f"[babe] {args.command} took {elapsed_ms:.0f} ms"
+        if getattr(args, "latest", False):
+            over = " (over budget)" if elapsed_ms > STARTUP_BUDGET_MS else ""
+            message += f", budget {STARTUP_BUDGET_MS} ms{over}"
+        print(message, file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,69 @@
-import pandas as pd
-import numpy as np
 from datetime import datetime
-import glob
 import os
+from transform_time_format import ingest_path
+from profiling import configure, stage, timed
+
+# pandas, numpy and validate (which needs both) are imported inside the
+# functions so that importing calculate_gap stays cheap for the CLI and the
+# pipeline runner
+
+
+def _load_inputs(file_name, sessions):
+    """Load and validate the spot, FX, interest rate and futures data."""
+    from validate import check_coverage, format_report, load_validated
+
+    frames = []
+    for name, name_sessions in [
+        ("SPTAUUSDOZ.IDC", None),
+        ("USDCHY.EX", None),
+        ("OpeningPrice", None),
+        (file_name, sessions),
+    ]:
+        with stage(f"load:{name}") as s:
+            frame, _ = load_validated(ingest_path(name), name, sessions=name_sessions)
+            s.rows_out = len(frame)
+        frames.append(frame)
+    spot_usd, exchange_rate, rmb_rate, data = frames
+
+    # Bars on days without an FX or interest rate are dropped by the joins
+    for rates, rates_name in [(exchange_rate, "USDCHY.EX"), (rmb_rate, "OpeningPrice")]:
+        coverage = check_coverage(
+            data["DateTime"].to_numpy(dtype="datetime64[D]"),
+            rates["DateTime"].to_numpy(dtype="datetime64[D]"),
+            name=f"{file_name} vs {rates_name}",
+        )
+        if coverage["missing_dates"]:
+            print(format_report(coverage))
+
+    return spot_usd, exchange_rate, rmb_rate, data
 
 
+@timed()
 def calculate_gap(au_file_name):
-    # Read all CSV files
-    spot_usd = pd.read_csv("data/SPTAUUSDOZ.IDC.csv", encoding_errors="replace")
-    exchange_rate = pd.read_csv("data/USDCHY.EX.csv", encoding_errors="replace")
-    rmb_rate = pd.read_csv("data/OpeningPrice.csv", encoding_errors="replace")
-    au_data = pd.read_csv(f"data/{au_file_name}.csv", encoding_errors="replace")
-
-    # Convert DateTime columns to datetime
-    spot_usd["DateTime"] = pd.to_datetime(spot_usd["DateTime"])
-    exchange_rate["DateTime"] = pd.to_datetime(exchange_rate["DateTime"]).dt.date
-    rmb_rate["DateTime"] = pd.to_datetime(rmb_rate["DateTime"]).dt.date
-    au_data["DateTime"] = pd.to_datetime(au_data["DateTime"])
+    import numpy as np
+    import pandas as pd
+    from validate import SHFE_SESSIONS
+
+    # Read and validate all CSV files; the results are sorted with unique
+    # DateTime keys so the merges below cannot multiply rows
+    spot_usd, exchange_rate, rmb_rate, au_data = _load_inputs(
+        au_file_name, SHFE_SESSIONS
+    )
+    exchange_rate["DateTime"] = exchange_rate["DateTime"].dt.date
+    rmb_rate["DateTime"] = rmb_rate["DateTime"].dt.date
 
     # Calculate S_RMB for each price type (open, high, low, close)
     # First, merge spot_usd with exchange rate based on date
     spot_usd["Date"] = spot_usd["DateTime"].dt.date
-    spot_with_rate = pd.merge(
-        spot_usd,
-        exchange_rate,
-        left_on="Date",
-        right_on="DateTime",
-        suffixes=("", "_rate"),
-    )
+    with stage("merge_fx", rows_in=[len(spot_usd), len(exchange_rate)]) as s:
+        spot_with_rate = pd.merge(
+            spot_usd,
+            exchange_rate,
+            left_on="Date",
+            right_on="DateTime",
+            suffixes=("", "_rate"),
+        )
+        s.rows_out = len(spot_with_rate)
 
     # Calculate S_RMB
     for col in ["open", "high", "low", "close"]:
@@ -36,13 +72,15 @@ def calculate_gap(au_file_name):
         )
 
     # Merge with RMB rate
-    spot_with_rates = pd.merge(
-        spot_with_rate,
-        rmb_rate,
-        left_on="Date",
-        right_on="DateTime",
-        suffixes=("", "_rmb"),
-    )
+    with stage("merge_rates", rows_in=[len(spot_with_rate), len(rmb_rate)]) as s:
+        spot_with_rates = pd.merge(
+            spot_with_rate,
+            rmb_rate,
+            left_on="Date",
+            right_on="DateTime",
+            suffixes=("", "_rmb"),
+        )
+        s.rows_out = len(spot_with_rates)
 
     def parse_expiry_from_filename(filename):
         # Extract year and month from filename (e.g., 'AU2406' -> 2024, 06)
@@ -56,9 +94,10 @@ def calculate_gap(au_file_name):
         return diff / 365  # Convert to years
 
     # Assuming au_file contains the filename
-    spot_with_rates["t"] = spot_with_rates["DateTime"].apply(
-        lambda x: calc_time_to_expiry(x, au_file_name)
-    )
+    with stage("time_to_expiry", rows_in=len(spot_with_rates)):
+        spot_with_rates["t"] = spot_with_rates["DateTime"].apply(
+            lambda x: calc_time_to_expiry(x, au_file_name)
+        )
 
     # Calculate F_RMB for each price type
     for col in ["open", "high", "low", "close"]:
@@ -67,13 +106,16 @@ def calculate_gap(au_file_name):
         )
 
     # Merge with AU data
-    final_data = pd.merge(
-        spot_with_rates,
-        au_data,
-        left_on="DateTime",
-        right_on="DateTime",
-        suffixes=("_spot", ""),
-    )
+    # Both sides are sorted and unique on DateTime, so join on the index to
+    # take the monotonic join fast path
+    with stage("join_bars", rows_in=[len(spot_with_rates), len(au_data)]) as s:
+        final_data = (
+            spot_with_rates.drop(columns=["DateTime_rate", "DateTime_rmb"])
+            .set_index("DateTime")
+            .join(au_data.set_index("DateTime"), how="inner", lsuffix="_spot")
+            .reset_index()
+        )
+        s.rows_out = len(final_data)
 
     # Calculate gaps for each price type
     for col in ["open", "high", "low", "close"]:
@@ -90,36 +132,37 @@ def calculate_gap(au_file_name):
     # Save to CSV with specific filename for each AU contract
     os.makedirs("results", exist_ok=True)
     output_filename = f"results/price_gaps_{au_file_name}.csv"
-    output_data.to_csv(output_filename, index=False)
+    with stage("to_csv", rows_in=len(output_data)):
+        output_data.to_csv(output_filename, index=False)
     return output_data
 
 
+@timed()
 def calculate_gc_gap(gc_file_name):
     """
     Calculate the gap between GC futures (in USD) and SPT gold prices
     """
-    # Read all CSV files
-    spot_usd = pd.read_csv("data/SPTAUUSDOZ.IDC.csv", encoding_errors="replace")
-    exchange_rate = pd.read_csv("data/USDCHY.EX.csv", encoding_errors="replace")
-    rmb_rate = pd.read_csv("data/OpeningPrice.csv", encoding_errors="replace")
-    gc_data = pd.read_csv(f"data/{gc_file_name}.csv", encoding_errors="replace")
-
-    # Convert DateTime columns to datetime
-    spot_usd["DateTime"] = pd.to_datetime(spot_usd["DateTime"])
-    exchange_rate["DateTime"] = pd.to_datetime(exchange_rate["DateTime"]).dt.date
-    rmb_rate["DateTime"] = pd.to_datetime(rmb_rate["DateTime"]).dt.date
-    gc_data["DateTime"] = pd.to_datetime(gc_data["DateTime"])
+    import numpy as np
+    import pandas as pd
+
+    # Read and validate all CSV files; the results are sorted with unique
+    # DateTime keys so the merges below cannot multiply rows
+    spot_usd, exchange_rate, rmb_rate, gc_data = _load_inputs(gc_file_name, None)
+    exchange_rate["DateTime"] = exchange_rate["DateTime"].dt.date
+    rmb_rate["DateTime"] = rmb_rate["DateTime"].dt.date
 
     # Calculate S_RMB for each price type (open, high, low, close)
     # First, merge spot_usd with exchange rate based on date
     spot_usd["Date"] = spot_usd["DateTime"].dt.date
-    spot_with_rate = pd.merge(
-        spot_usd,
-        exchange_rate,
-        left_on="Date",
-        right_on="DateTime",
-        suffixes=("", "_rate"),
-    )
+    with stage("merge_fx", rows_in=[len(spot_usd), len(exchange_rate)]) as s:
+        spot_with_rate = pd.merge(
+            spot_usd,
+            exchange_rate,
+            left_on="Date",
+            right_on="DateTime",
+            suffixes=("", "_rate"),
+        )
+        s.rows_out = len(spot_with_rate)
 
     # Calculate S_RMB
     for col in ["open", "high", "low", "close"]:
@@ -128,13 +171,15 @@ def calculate_gc_gap(gc_file_name):
         )
 
     # Merge with RMB rate
-    spot_with_rates = pd.merge(
-        spot_with_rate,
-        rmb_rate,
-        left_on="Date",
-        right_on="DateTime",
-        suffixes=("", "_rmb"),
-    )
+    with stage("merge_rates", rows_in=[len(spot_with_rate), len(rmb_rate)]) as s:
+        spot_with_rates = pd.merge(
+            spot_with_rate,
+            rmb_rate,
+            left_on="Date",
+            right_on="DateTime",
+            suffixes=("", "_rmb"),
+        )
+        s.rows_out = len(spot_with_rates)
 
     def parse_gc_expiry_from_filename(filename):
         # Extract year and month from filename (e.g., 'GCM24E.CMX' -> 2024, 06)
@@ -169,9 +214,10 @@ def calculate_gc_gap(gc_file_name):
         return diff / 365  # Convert to years
 
     # Calculate time to expiry for each date
-    spot_with_rates["t"] = spot_with_rates["DateTime"].apply(
-        lambda x: calc_gc_time_to_expiry(x, gc_file_name)
-    )
+    with stage("time_to_expiry", rows_in=len(spot_with_rates)):
+        spot_with_rates["t"] = spot_with_rates["DateTime"].apply(
+            lambda x: calc_gc_time_to_expiry(x, gc_file_name)
+        )
 
     # Calculate F_RMB for each price type
     for col in ["open", "high", "low", "close"]:
@@ -181,27 +227,38 @@ def calculate_gc_gap(gc_file_name):
 
     # Convert GC prices from USD to RMB
     gc_data["Date"] = gc_data["DateTime"].dt.date
-    gc_with_rate = pd.merge(
-        gc_data,
-        exchange_rate,
-        left_on="Date",
-        right_on="DateTime",
-        suffixes=("", "_rate"),
-    )
+    with stage("merge_gc_fx", rows_in=[len(gc_data), len(exchange_rate)]) as s:
+        gc_with_rate = pd.merge(
+            gc_data,
+            exchange_rate,
+            left_on="Date",
+            right_on="DateTime",
+            suffixes=("", "_rate"),
+        )
+        s.rows_out = len(gc_with_rate)
 
     # Convert GC prices from USD to RMB (per gram)
     for col in ["open", "high", "low", "close"]:
         gc_with_rate[f"{col}_rmb"] = gc_with_rate[col] * gc_with_rate["OPEN"] / 31.1035
 
     # Merge spot data with GC data
-    final_data = pd.merge(
-        spot_with_rates[
-            ["DateTime", "F_RMB_open", "F_RMB_high", "F_RMB_low", "F_RMB_close"]
-        ],
-        gc_with_rate[["DateTime", "open_rmb", "high_rmb", "low_rmb", "close_rmb"]],
-        on="DateTime",
-        how="inner",
-    )
+    # Both sides are sorted and unique on DateTime, so join on the index to
+    # take the monotonic join fast path
+    with stage("join_bars", rows_in=[len(spot_with_rates), len(gc_with_rate)]) as s:
+        final_data = (
+            spot_with_rates[
+                ["DateTime", "F_RMB_open", "F_RMB_high", "F_RMB_low", "F_RMB_close"]
+            ]
+            .set_index("DateTime")
+            .join(
+                gc_with_rate[
+                    ["DateTime", "open_rmb", "high_rmb", "low_rmb", "close_rmb"]
+                ].set_index("DateTime"),
+                how="inner",
+            )
+            .reset_index()
+        )
+        s.rows_out = len(final_data)
 
     # Calculate gaps for each price type
     for col in ["open", "high", "low", "close"]:
@@ -220,11 +277,16 @@ def calculate_gc_gap(gc_file_name):
     # Save to CSV with specific filename for each GC contract
     os.makedirs("results", exist_ok=True)
     output_filename = f"results/price_gaps_{gc_file_name}.csv"
-    output_data.to_csv(output_filename, index=False)
+    with stage("to_csv", rows_in=len(output_data)):
+        output_data.to_csv(output_filename, index=False)
     return output_data
 
 
 if __name__ == "__main__":
+    import glob
+
+    configure()
+
     # Create results directory if it doesn't exist
     os.makedirs("results", exist_ok=True)
 
@@ -1,11 +1,12 @@
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel, QGroupBox
 from PyQt5.QtCore import QTimer, QDateTime
 from zoneinfo import ZoneInfo
-from WindPy import w
 import pandas as pd
 import threading
 import datetime
 import sys
+from profiling import configure, stage, timed
+from live_chart import LiveChart
 
 # 产品列表和DataFrame初始化
 products = ["AU2412.SHF", "SPTAUUSDOZ.IDC"]
@@ -19,6 +20,9 @@ columns = (
 df = pd.DataFrame(columns=columns)
 current_data = {prod: {"Bid": None, "Ask": None, "Latest": None} for prod in products}
 
+# 图表中显示的价差序列
+chart_series = ["Bid_Difference", "Ask_Difference", "Latest_Difference"]
+
 shanghai_tz = ZoneInfo("Asia/Shanghai")
 current_week = datetime.datetime.now(shanghai_tz).isocalendar()[1]
 
@@ -26,6 +30,14 @@ stop_timer = False
 last_period = None
 
 
+def to_float(value):
+    """将行情值转换为float，缺失值返回NaN。"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
 def check_trading_hours(now):
     """检查当前时间是否在指定的交易时段内。"""
     if now.weekday() == 5 or now.weekday() == 6:
@@ -50,6 +62,7 @@ def check_trading_hours(now):
         return None
 
 
+@timed()
 def update_dataframe():
     global df
     now = datetime.datetime.now(shanghai_tz)
@@ -82,6 +95,7 @@ def update_dataframe():
         df = pd.concat([df, new_data], ignore_index=True)
 
 
+@timed()
 def save_period_data(period):
     global df
     if df.empty:
@@ -106,7 +120,8 @@ def schedule_data_updates():
     current_period = check_trading_hours(now)
 
     if current_period:
-        update_dataframe()
+        with stage("tick", rows_in=len(df)):
+            update_dataframe()
         last_period = current_period
     elif last_period:
         # 如果当前不在交易时段但存在上一个时段，保存该时段数据
@@ -132,6 +147,8 @@ def myCallback(indata):
 
 def run_wsq():
     """启动WindPy实时数据订阅。"""
+    from WindPy import w
+
     if w.start().ErrorCode != 0:
         print("WindPy start failed")
         return
@@ -139,8 +156,10 @@ def run_wsq():
 
 
 class MarketDataDisplay(QWidget):
-    def __init__(self):
+    def __init__(self, save_on_close=True):
         super().__init__()
+        # 回放模式下关闭窗口时不保存数据
+        self.save_on_close = save_on_close
         self.initUI()
 
     def initUI(self):
@@ -193,14 +212,34 @@ class MarketDataDisplay(QWidget):
         self.ask_layout.addWidget(self.labels_ask["Difference"])
         self.latest_layout.addWidget(self.labels_latest["Difference"])
 
+        # 实时价差走势图（增量绘制）
+        self.chart = LiveChart(chart_series)
+        layout.addWidget(self.chart)
+        self.label_texts = {}
+        self.rows_shown = 0
+
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_labels)
         self.timer.start(1000)
 
+    def set_label_text(self, label, text):
+        """仅在文本变化时更新标签，避免不必要的重绘。"""
+        if self.label_texts.get(id(label)) != text:
+            self.label_texts[id(label)] = text
+            label.setText(text)
+
+    @timed()
     def update_labels(self):
         current_time = QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm:ss")
         self.current_time_label.setText(f"当前时间: {current_time}")
-        if not df.empty:
+        # 只有出现新数据行时才刷新标签和图表
+        # 新时段开始时 df 已被清空，此时没有可显示的数据
+        if df.empty:
+            self.rows_shown = 0
+        elif len(df) != self.rows_shown:
+            # 上次刷新后新增的所有行都要画进图表（df 在两次刷新之间被重置时取全部）
+            new_rows = df.iloc[self.rows_shown :] if len(df) > self.rows_shown else df
+            self.rows_shown = len(df)
             latest_data = df.iloc[-1]
             for product in products:
                 bid_price = latest_data.get(f"{product}_Bid")
@@ -222,34 +261,54 @@ class MarketDataDisplay(QWidget):
                     else f"{product}: 等待数据..."
                 )
 
-                self.labels_bid[product].setText(text_bid)
-                self.labels_ask[product].setText(text_ask)
-                self.labels_latest[product].setText(text_latest)
+                self.set_label_text(self.labels_bid[product], text_bid)
+                self.set_label_text(self.labels_ask[product], text_ask)
+                self.set_label_text(self.labels_latest[product], text_latest)
 
             bid_diff = latest_data.get("Bid_Difference")
             ask_diff = latest_data.get("Ask_Difference")
             latest_diff = latest_data.get("Latest_Difference")
 
-            self.labels_bid["Difference"].setText(
-                f"SPTAUUSDOZ.IDC - AU2412.SHF: {bid_diff:.2f}"
-                if bid_diff is not None
-                else "SPTAUUSDOZ.IDC - AU2412.SHF: 等待数据..."
+            self.set_label_text(
+                self.labels_bid["Difference"],
+                (
+                    f"SPTAUUSDOZ.IDC - AU2412.SHF: {bid_diff:.2f}"
+                    if bid_diff is not None
+                    else "SPTAUUSDOZ.IDC - AU2412.SHF: 等待数据..."
+                ),
             )
-            self.labels_ask["Difference"].setText(
-                f"SPTAUUSDOZ.IDC - AU2412.SHF: {ask_diff:.2f}"
-                if ask_diff is not None
-                else "SPTAUUSDOZ.IDC - AU2412.SHF: 等待数据..."
+            self.set_label_text(
+                self.labels_ask["Difference"],
+                (
+                    f"SPTAUUSDOZ.IDC - AU2412.SHF: {ask_diff:.2f}"
+                    if ask_diff is not None
+                    else "SPTAUUSDOZ.IDC - AU2412.SHF: 等待数据..."
+                ),
             )
-            self.labels_latest["Difference"].setText(
-                f"SPTAUUSDOZ.IDC - AU2412.SHF: {latest_diff:.2f}"
-                if latest_diff is not None
-                else "SPTAUUSDOZ.IDC - AU2412.SHF: 等待数据..."
+            self.set_label_text(
+                self.labels_latest["Difference"],
+                (
+                    f"SPTAUUSDOZ.IDC - AU2412.SHF: {latest_diff:.2f}"
+                    if latest_diff is not None
+                    else "SPTAUUSDOZ.IDC - AU2412.SHF: 等待数据..."
+                ),
             )
 
+            for _, row in new_rows.iterrows():
+                timestamp = datetime.datetime.strptime(
+                    str(row["Time"]), "%Y-%m-%d %H:%M:%S"
+                ).timestamp()
+                self.chart.append(
+                    timestamp, [to_float(row.get(col)) for col in chart_series]
+                )
+
     def closeEvent(self, event):
         """重写closeEvent以在程序关闭时保存数据。"""
         global stop_timer
         stop_timer = True
+        if not self.save_on_close:
+            event.accept()
+            return
         if df.empty:
             print("没有数据可保存。")
             event.accept()  # 确认关闭
@@ -257,20 +316,52 @@ class MarketDataDisplay(QWidget):
 
         if last_period:
             save_period_data(last_period)
+            if df.empty:
+                event.accept()
+                return
 
         # 获取DataFrame中的最小和最大日期
-        min_date = df["Time"].min().strftime("%Y-%m-%d")
-        max_date = df["Time"].max().strftime("%Y-%m-%d")
+        times = pd.to_datetime(df["Time"])
+        min_date = times.min().strftime("%Y-%m-%d")
+        max_date = times.max().strftime("%Y-%m-%d")
         filename = f"final_data_{min_date}_to_{max_date}.csv"
         df.to_csv(filename, index=False)
         print(f"剩余数据已保存到 {filename}")
         event.accept()  # 确认关闭
 
 
-if __name__ == "__main__":
+def replay(file_path, interval=1000):
+    """回放已保存的行情数据文件（save_period_data 的输出），无需连接WindPy。"""
+    recorded = pd.read_csv(file_path)
+    app = QApplication(sys.argv)
+    md_display = MarketDataDisplay(save_on_close=False)
+    md_display.setWindowTitle(f"行情回放: {file_path}")
+    md_display.show()
+
+    position = 0
+
+    def replay_next():
+        global df
+        nonlocal position
+        if stop_timer or position >= len(recorded):
+            return
+        df = pd.concat([df, recorded.iloc[[position]]], ignore_index=True)
+        position += 1
+        QTimer.singleShot(interval, replay_next)
+
+    replay_next()
+    return app.exec_()
+
+
+def main():
     app = QApplication(sys.argv)
     md_display = MarketDataDisplay()
     md_display.show()
     schedule_data_updates()
     run_wsq()
-    sys.exit(app.exec_())
+    return app.exec_()
+
+
+if __name__ == "__main__":
+    configure()
+    sys.exit(main())
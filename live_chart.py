@@ -0,0 +1,264 @@
+import datetime
+
+import numpy as np
+from PyQt5.QtCore import QPointF, QRect, QRectF, Qt, QTimer
+from PyQt5.QtGui import QColor, QPainter, QPen, QPixmap, QPolygonF
+from PyQt5.QtWidgets import QWidget
+
+# One point per second over a full day and night session fits comfortably
+DEFAULT_CAPACITY = 1 << 16
+
+# Repaint at most this often; appends in between are drawn together
+FRAME_INTERVAL_MS = 16
+
+SERIES_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b"]
+
+
+class RingBuffer:
+    """Fixed-size circular buffer of timestamps and one value per series."""
+
+    def __init__(self, n_series, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.times = np.empty(capacity, dtype=np.float64)
+        self.values = np.empty((n_series, capacity), dtype=np.float64)
+        self.start = 0
+        self.count = 0
+        # Total number of points ever appended, used to find new points
+        self.total = 0
+
+    def append(self, t, values):
+        end = (self.start + self.count) % self.capacity
+        self.times[end] = t
+        self.values[:, end] = values
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+        self.total += 1
+
+    def view(self, last=None):
+        """Return (times, values) in time order, optionally only the last n."""
+        n = self.count if last is None else min(last, self.count)
+        first = (self.start + self.count - n) % self.capacity
+        if first + n <= self.capacity:
+            return self.times[first : first + n], self.values[:, first : first + n]
+        idx = (first + np.arange(n)) % self.capacity
+        return self.times[idx], self.values[:, idx]
+
+
+def decimate_minmax(x, y, x0, x1, width):
+    """
+    Reduce a series to two points (min and max) per pixel column between x0
+    and x1, so a chart of any length costs the same to draw and spikes stay
+    visible.
+
+    Returns:
+        (x, y) of the decimated points
+    """
+    if len(x) <= 2 * width:
+        return x, y
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    if not len(x):
+        return x, y
+    column = ((x - x0) / (x1 - x0) * width).astype(np.int64)
+    # x is sorted, so every pixel column is a contiguous run
+    starts = np.flatnonzero(np.r_[True, column[1:] != column[:-1]])
+    lo = np.minimum.reduceat(y, starts)
+    hi = np.maximum.reduceat(y, starts)
+    # Draw each column as a vertical stroke from min to max at its first x
+    xs = np.repeat(x[starts], 2)
+    ys = np.empty(2 * len(starts))
+    ys[0::2] = lo
+    ys[1::2] = hi
+    return xs, ys
+
+
+class LiveChart(QWidget):
+    """
+    Scrolling line chart for live data.
+
+    Points are kept in a RingBuffer and drawn onto a cached pixmap. New points
+    are painted incrementally and only the rectangle they cover is updated;
+    the whole chart is redrawn (decimated to one min/max pair per pixel
+    column) only when the time window scrolls, the value range grows or the
+    widget is resized.
+    """
+
+    def __init__(
+        self,
+        series,
+        window_seconds=4 * 3600,
+        capacity=DEFAULT_CAPACITY,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.series = list(series)
+        self.window = float(window_seconds)
+        self.buffer = RingBuffer(len(self.series), capacity)
+        self.pens = [
+            # Cosmetic 1px pens take Qt's fast line drawing path
+            QPen(QColor(SERIES_COLORS[i % len(SERIES_COLORS)]), 1)
+            for i in range(len(self.series))
+        ]
+        self.margin_left = 60
+        self.margin_bottom = 20
+        self.setMinimumHeight(200)
+
+        self._pixmap = None
+        self._x0 = None
+        self._y_range = None
+        self._drawn = 0
+        self._needs_full_redraw = True
+
+        self._frame_timer = QTimer(self)
+        self._frame_timer.timeout.connect(self._render)
+        self._frame_timer.start(FRAME_INTERVAL_MS)
+
+    def append(self, t, values):
+        """Add a point; values are in the order of the series names."""
+        self.buffer.append(t, values)
+
+    # Coordinate mapping
+    def _plot_rect(self):
+        return QRectF(
+            self.margin_left,
+            4,
+            max(1, self.width() - self.margin_left - 4),
+            max(1, self.height() - self.margin_bottom - 8),
+        )
+
+    def _map(self, t, v):
+        rect = self._plot_rect()
+        x = rect.left() + (t - self._x0) / self.window * rect.width()
+        lo, hi = self._y_range
+        y = rect.bottom() - (v - lo) / (hi - lo) * rect.height()
+        return x, y
+
+    def _value_range(self, values):
+        finite = values[np.isfinite(values)]
+        if not len(finite):
+            return (-1.0, 1.0)
+        lo, hi = float(finite.min()), float(finite.max())
+        pad = max((hi - lo) * 0.1, 1e-6)
+        return (lo - pad, hi + pad)
+
+    def _render(self):
+        """Frame tick: bring the cached pixmap up to date with the buffer."""
+        new = self.buffer.total - self._drawn
+        if not new and not self._needs_full_redraw:
+            return
+        if not self.buffer.count:
+            return
+        times, values = self.buffer.view(last=new + 1)
+        latest = times[-1]
+        if self._x0 is None or latest > self._x0 + self.window:
+            # Jump the window forward by a quarter so scrolling is rare
+            self._x0 = latest - self.window * 0.75
+            self._needs_full_redraw = True
+        if self._y_range is not None:
+            lo, hi = self._y_range
+            finite = values[np.isfinite(values)]
+            if len(finite) and (finite.min() < lo or finite.max() > hi):
+                self._needs_full_redraw = True
+
+        if self._needs_full_redraw or self._pixmap is None:
+            self._redraw_all()
+        else:
+            self.update(self._draw_segment(times, values))
+        self._drawn = self.buffer.total
+
+    def _redraw_all(self):
+        self._needs_full_redraw = False
+        self._pixmap = QPixmap(self.size())
+        self._pixmap.fill(Qt.white)
+
+        times, values = self.buffer.view()
+        visible = times >= self._x0
+        times, values = times[visible], values[:, visible]
+        self._y_range = self._value_range(values)
+
+        painter = QPainter(self._pixmap)
+        self._draw_axes(painter)
+        width = int(self._plot_rect().width())
+        for i, pen in enumerate(self.pens):
+            x, y = decimate_minmax(
+                times, values[i], self._x0, self._x0 + self.window, width
+            )
+            self._draw_lines(painter, pen, x, y)
+        painter.end()
+        self.update()
+
+    def _draw_segment(self, times, values):
+        """Draw points appended since the last frame; return the dirty rect."""
+        painter = QPainter(self._pixmap)
+        dirty = QRectF()
+        for i, pen in enumerate(self.pens):
+            dirty = dirty.united(self._draw_lines(painter, pen, times, values[i]))
+        painter.end()
+        return dirty.toAlignedRect().adjusted(-2, -2, 2, 2)
+
+    def _draw_lines(self, painter, pen, times, values):
+        """Draw a polyline per run of non-NaN values; return its bounding rect."""
+        painter.setPen(pen)
+        painter.setClipRect(self._plot_rect())
+        xs, ys = self._map(times, values)
+        bounds = QRectF()
+        finite = np.isfinite(ys)
+        # Break the line at missing values
+        breaks = np.flatnonzero(np.diff(finite.astype(np.int8))) + 1
+        for run_x, run_y, ok in zip(
+            np.split(xs, breaks), np.split(ys, breaks), np.split(finite, breaks)
+        ):
+            if not ok[0] or len(run_x) < 2:
+                continue
+            polygon = _polygon(run_x, run_y)
+            painter.drawPolyline(polygon)
+            bounds = bounds.united(polygon.boundingRect())
+        painter.setClipping(False)
+        return bounds
+
+    def _draw_axes(self, painter):
+        rect = self._plot_rect()
+        painter.setPen(QPen(QColor("#888888"), 1))
+        painter.drawRect(rect)
+        lo, hi = self._y_range
+        painter.drawText(2, int(rect.top()) + 12, f"{hi:.2f}")
+        painter.drawText(2, int(rect.bottom()), f"{lo:.2f}")
+        painter.drawText(int(rect.left()), self.height() - 4, _format_time(self._x0))
+        end = _format_time(self._x0 + self.window)
+        painter.drawText(
+            QRect(0, self.height() - self.margin_bottom, self.width() - 4, 18),
+            Qt.AlignRight | Qt.AlignVCenter,
+            end,
+        )
+        for i, (name, pen) in enumerate(zip(self.series, self.pens)):
+            painter.setPen(pen)
+            painter.drawText(int(rect.left()) + 8 + i * 140, int(rect.top()) + 14, name)
+
+    def paintEvent(self, event):
+        if self._pixmap is None:
+            return
+        painter = QPainter(self)
+        painter.drawPixmap(event.rect(), self._pixmap, event.rect())
+        painter.end()
+
+    def resizeEvent(self, event):
+        self._needs_full_redraw = True
+        super().resizeEvent(event)
+
+
+def _polygon(xs, ys):
+    """Build a QPolygonF by writing the coordinates straight into its memory."""
+    polygon = QPolygonF()
+    polygon.fill(QPointF(), len(xs))
+    buffer = polygon.data()
+    buffer.setsize(len(xs) * 2 * 8)
+    points = np.frombuffer(buffer, dtype=np.float64).reshape(-1, 2)
+    points[:, 0] = xs
+    points[:, 1] = ys
+    return polygon
+
+
+def _format_time(t):
+    return datetime.datetime.fromtimestamp(t).strftime("%H:%M:%S")
@@ -0,0 +1,333 @@
+import argparse
+import glob
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+
+# Content-addressed copies of every artifact the pipeline has built
+ARTIFACT_DIR = os.path.join("cache", "artifacts")
+MANIFEST_FILE = os.path.join("cache", "pipeline_manifest.json")
+
+# Bump to invalidate every cached artifact, e.g. after a pandas upgrade
+PIPELINE_VERSION = "1"
+
+# Code every stage depends on, on top of its own module
+SHARED_CODE = ["transform_time_format.py", "validate.py", "profiling.py"]
+
+# Fixed locations used by the stage scripts
+DATA_DIR = "data"
+RESULTS_DIR = "results"
+FIGS_DIR = "figs"
+
+SPOT_FILES = ["SPTAUUSDOZ.IDC", "USDCHY.EX", "OpeningPrice"]
+
+
+@dataclass
+class Task:
+    """A single unit of work in the pipeline DAG."""
+
+    name: str
+    func: str  # "module:function", imported in the worker process
+    args: tuple = ()
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    code: list = field(default_factory=list)
+    params: dict = field(default_factory=dict)  # keyword arguments of func
+    deps: list = field(default_factory=list)
+
+
+def build_tasks():
+    """
+    Declare the data -> gaps -> stats -> figures DAG for the files on disk.
+
+    The paths match the ones cal_gap.py, t_test.py and plot.py read and write.
+
+    Returns:
+        Dictionary mapping task name to Task, in dependency order
+    """
+    from transform_time_format import ingest_path
+
+    spot_inputs = [ingest_path(name, DATA_DIR) for name in SPOT_FILES]
+    tasks = {}
+
+    contracts = []
+    for prefix, func in [("AU", "calculate_gap"), ("GC", "calculate_gc_gap")]:
+        for path in sorted(glob.glob(os.path.join(DATA_DIR, f"{prefix}*.csv"))):
+            contract = os.path.basename(path)[: -len(".csv")]
+            contracts.append(contract)
+            tasks[f"gaps:{contract}"] = Task(
+                name=f"gaps:{contract}",
+                func=f"cal_gap:{func}",
+                args=(contract,),
+                inputs=spot_inputs + [ingest_path(contract, DATA_DIR)],
+                outputs=[f"{RESULTS_DIR}/price_gaps_{contract}.csv"],
+                code=["cal_gap.py"] + SHARED_CODE,
+            )
+
+    gap_files = [tasks[f"gaps:{c}"].outputs[0] for c in contracts]
+    tasks["stats"] = Task(
+        name="stats",
+        func="t_test:main",
+        # Only the declared files, so the key covers everything that is read
+        args=(gap_files,),
+        inputs=gap_files,
+        outputs=[
+            f"{RESULTS_DIR}/au_t_test_results.csv",
+            f"{RESULTS_DIR}/gc_t_test_results.csv",
+        ],
+        code=["t_test.py"] + SHARED_CODE,
+        deps=[f"gaps:{c}" for c in contracts],
+    )
+
+    for contract, gap_file in zip(contracts, gap_files):
+        tasks[f"plot:{contract}"] = Task(
+            name=f"plot:{contract}",
+            func="plot:plot_gaps",
+            args=(gap_file,),
+            inputs=[gap_file],
+            outputs=[f"{FIGS_DIR}/price_gaps_plot_{contract}.png"],
+            code=["plot.py"] + SHARED_CODE,
+            params={"dpi": 450},
+            deps=[f"gaps:{contract}"],
+        )
+    return tasks
+
+
+class FileHasher:
+    """
+    SHA-256 of file contents, memoized on (size, mtime) so unchanged files
+    are not re-read on every run.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or {}
+
+    def digest(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = [st.st_size, st.st_mtime_ns]
+        cached = self.cache.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.cache[path] = [stamp, digest]
+        return digest
+
+
+def task_key(task, hasher):
+    """Content hash of a task's inputs, code and parameters."""
+    h = hashlib.sha256()
+    h.update(PIPELINE_VERSION.encode())
+    h.update(json.dumps([task.func, list(task.args), task.params]).encode())
+    for path in task.inputs + task.code:
+        digest = hasher.digest(path)
+        if digest is None:
+            raise FileNotFoundError(f"{task.name}: missing input {path}")
+        h.update(f"{path}\0{digest}\n".encode())
+    return h.hexdigest()
+
+
+def _artifact_path(key, output):
+    return os.path.join(ARTIFACT_DIR, key[:2], key, os.path.basename(output))
+
+
+def _load_manifest():
+    try:
+        with open(MANIFEST_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"files": {}, "tasks": {}}
+
+
+def _save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_FILE), exist_ok=True)
+    tmp_file = f"{MANIFEST_FILE}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+
+def _is_fresh(task, key, manifest, hasher):
+    """True when the outputs on disk are the ones built for this key."""
+    record = manifest["tasks"].get(task.name)
+    if not record or record["key"] != key:
+        return False
+    return all(
+        hasher.digest(output) == record["outputs"].get(output)
+        for output in task.outputs
+    )
+
+
+def _restore(task, key):
+    """Copy the outputs for this key back from the artifact store, if present."""
+    artifacts = [_artifact_path(key, output) for output in task.outputs]
+    if not all(os.path.exists(a) for a in artifacts):
+        return False
+    for artifact, output in zip(artifacts, task.outputs):
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        shutil.copy2(artifact, output)
+    return True
+
+
+def _store(task, key):
+    for output in task.outputs:
+        artifact = _artifact_path(key, output)
+        os.makedirs(os.path.dirname(artifact), exist_ok=True)
+        shutil.copy2(output, artifact)
+
+
+def run_task(func, args, params):
+    """Run a task function in a worker process."""
+    module_name, func_name = func.split(":")
+    getattr(importlib.import_module(module_name), func_name)(*args, **params)
+
+
+def run_pipeline(targets=None, workers=None, force=False, dry_run=False):
+    """
+    Bring the requested tasks and everything they depend on up to date.
+
+    Tasks whose content key matches the manifest and whose outputs are
+    unchanged are skipped; outputs built before for the same key are restored
+    from the artifact store; everything else runs in a process pool as soon as
+    its dependencies are done.
+
+    Args:
+        targets: Task names or prefixes ("gaps", "stats", "plot:AU2412");
+            None runs every task
+        workers: Number of worker processes
+        force: Rebuild every selected task
+        dry_run: Only report which tasks are stale
+
+    Returns:
+        Dictionary mapping task name to "fresh", "restored", "built" or "stale"
+    """
+    tasks = build_tasks()
+    selected = _select(tasks, targets)
+    manifest = _load_manifest()
+    hasher = FileHasher(manifest["files"])
+    status = {}
+
+    def finish(name, key):
+        task = tasks[name]
+        manifest["tasks"][name] = {
+            "key": key,
+            "outputs": {output: hasher.digest(output) for output in task.outputs},
+        }
+
+    def prepare(name):
+        """Skip or restore the task if possible; return its key if it must run."""
+        task = tasks[name]
+        key = task_key(task, hasher)
+        if not force and _is_fresh(task, key, manifest, hasher):
+            status[name] = "fresh"
+        elif not force and not dry_run and _restore(task, key):
+            status[name] = "restored"
+            finish(name, key)
+        else:
+            status[name] = "stale"
+            return key
+        return None
+
+    pending = [name for name in tasks if name in selected]
+    running = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    task = tasks[name]
+                    deps = [d for d in task.deps if d in selected]
+                    if any(status.get(d) in (None, "running") for d in deps):
+                        continue
+                    pending.remove(name)
+                    if dry_run and any(status[d] == "stale" for d in deps):
+                        status[name] = "stale"
+                        continue
+                    key = prepare(name)
+                    if key is None or dry_run:
+                        continue
+                    print(f"[pipeline] building {name}")
+                    status[name] = "running"
+                    future = executor.submit(
+                        run_task, task.func, task.args, task.params
+                    )
+                    running[future] = (name, key)
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, key = running.pop(future)
+                    future.result()
+                    _store(tasks[name], key)
+                    finish(name, key)
+                    status[name] = "built"
+    finally:
+        if not dry_run:
+            _save_manifest(manifest)
+    return status
+
+
+def _select(tasks, targets):
+    """Resolve target names or prefixes to the set of tasks plus their deps."""
+    if not targets:
+        return set(tasks)
+    selected = set()
+    stack = [
+        name
+        for name in tasks
+        if any(name == t or name.split(":")[0] == t for t in targets)
+    ]
+    if not stack:
+        raise ValueError(f"No tasks match {', '.join(targets)}")
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(tasks[name].deps)
+    return selected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rebuild stale gaps, stats and figures from data/"
+    )
+    parser.add_argument(
+        "targets", nargs="*", help="Tasks to build, e.g. gaps stats plot:AU2412"
+    )
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="Rebuild everything")
+    parser.add_argument(
+        "-n", "--dry-run", action="store_true", help="Only list stale tasks"
+    )
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    status = run_pipeline(
+        args.targets or None,
+        workers=args.workers,
+        force=args.force,
+        dry_run=args.dry_run,
+    )
+    counts = {}
+    for name, state in status.items():
+        counts[state] = counts.get(state, 0) + 1
+        if args.dry_run and state == "stale":
+            print(f"[pipeline] stale {name}")
+    summary = ", ".join(f"{n} {state}" for state, n in sorted(counts.items()))
+    print(f"[pipeline] {summary} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
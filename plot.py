@@ -1,12 +1,15 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.dates import DateFormatter
 import glob
 import os
+from profiling import configure, stage, timed
 
 
-def plot_gaps(file_path):
+@timed()
+def plot_gaps(file_path, dpi=450):
     # Extract contract code from filename for plot title
     contract_code = file_path.replace("results/price_gaps_", "").replace(".csv", "")
 
@@ -14,8 +17,10 @@ def plot_gaps(file_path):
     is_gc = "GC" in contract_code
 
     # Read the data
-    df = pd.read_csv(file_path)
-    df["DateTime"] = pd.to_datetime(df["DateTime"])
+    with stage("read_csv") as s:
+        df = pd.read_csv(file_path)
+        df["DateTime"] = pd.to_datetime(df["DateTime"])
+        s.rows_out = len(df)
 
     # Create the figure and axis
     plt.figure(figsize=(12, 6))
@@ -86,15 +91,57 @@ def plot_gaps(file_path):
     os.makedirs("figs", exist_ok=True)
 
     # Save the plot with contract-specific filename
-    plt.savefig(
-        f"figs/price_gaps_plot_{contract_code}.png", dpi=450, bbox_inches="tight"
-    )
+    with stage("savefig", rows_in=len(df)):
+        plt.savefig(
+            f"figs/price_gaps_plot_{contract_code}.png", dpi=dpi, bbox_inches="tight"
+        )
 
     # Close the figure to free memory
     plt.close()
 
 
+@timed()
+def plot_profile_heatmap(table, title, output_file):
+    """
+    Plot a profile table from seasonality.py as a heatmap.
+
+    Args:
+        table: DataFrame with one row per contract (or weekday) and one column
+            per bucket, e.g. from seasonality.profile_table
+        title: Plot title
+        output_file: Path of the PNG file
+    """
+    values = table.to_numpy(dtype=float)
+    # Center the colour scale on zero so positive and negative gaps stand out
+    limit = np.nanmax(np.abs(values)) if np.isfinite(values).any() else 1.0
+
+    plt.figure(figsize=(14, max(3, 0.4 * len(table) + 1.5)))
+    plt.imshow(
+        np.ma.masked_invalid(values),
+        aspect="auto",
+        interpolation="nearest",
+        cmap="RdBu_r",
+        vmin=-limit,
+        vmax=limit,
+    )
+    plt.colorbar(pad=0.01)
+
+    # At most about 24 labels on the bucket axis
+    step = max(1, len(table.columns) // 24)
+    plt.xticks(range(0, len(table.columns), step), table.columns[::step], rotation=45)
+    plt.yticks(range(len(table.index)), table.index)
+    plt.title(title, fontsize=14, pad=15)
+    plt.tight_layout()
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with stage("savefig", rows_in=values.size):
+        plt.savefig(output_file, dpi=450, bbox_inches="tight")
+    plt.close()
+
+
 if __name__ == "__main__":
+    configure()
+
     # Create figs directory if it doesn't exist
     os.makedirs("figs", exist_ok=True)
 
@@ -0,0 +1,260 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Profiling is off unless BABE_PROFILE is set or a script is started with
+# --profile. The value is a comma separated list of options:
+#   1 / trace   stage timers and row counts, written as a Chrome trace
+#   memory      also record the peak traced memory of every stage (tracemalloc)
+#   cprofile    also write a cProfile dump of the whole run
+# e.g. BABE_PROFILE=memory,cprofile python cal_gap.py
+ENV_VAR = "BABE_PROFILE"
+OUTPUT_DIR_ENV_VAR = "BABE_PROFILE_DIR"
+DEFAULT_OUTPUT_DIR = "profiles"
+
+_enabled = False
+_options = set()
+_events = []
+_stack = threading.local()
+_lock = threading.Lock()
+_profiler = None
+_run_name = None
+_written = False
+_start = time.perf_counter()
+
+
+class Stage:
+    """Measurements of a single stage, filled in by the instrumented code."""
+
+    __slots__ = (
+        "name",
+        "rows_in",
+        "rows_out",
+        "args",
+        "peak_memory",
+        "memory_before",
+        "max_rss_before",
+    )
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.args = {}
+        self.peak_memory = 0
+        self.memory_before = 0
+        self.max_rss_before = None
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(options="trace", run_name=None):
+    """
+    Enable profiling for this process.
+
+    Args:
+        options: Comma separated options, see the module comment
+        run_name: Name used for the output files, defaults to the script name
+    """
+    global _enabled, _options, _profiler, _run_name
+    if _enabled:
+        return
+    _options = {opt.strip() for opt in str(options).split(",") if opt.strip()}
+    _enabled = True
+    _run_name = run_name or os.path.splitext(os.path.basename(sys.argv[0]))[0] or "run"
+
+    if "memory" in _options and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if "cprofile" in _options:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    atexit.register(write_trace)
+
+
+def configure(argv=None):
+    """
+    Enable profiling from the BABE_PROFILE environment variable or a
+    --profile[=options] command line flag, which is removed from argv.
+    """
+    argv = sys.argv if argv is None else argv
+    options = os.environ.get(ENV_VAR)
+    for arg in list(argv[1:]):
+        if arg == "--profile" or arg.startswith("--profile="):
+            argv.remove(arg)
+            options = arg.partition("=")[2] or options or "trace"
+    if options and options != "0":
+        enable(options)
+
+
+def _max_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Time a named stage of the pipeline.
+
+    The yielded Stage can be used to record the number of output rows and any
+    extra arguments. Stages nest; nothing is recorded unless profiling is
+    enabled.
+
+        with stage("merge_fx", rows_in=[len(left), len(right)]) as s:
+            merged = pd.merge(left, right, ...)
+            s.rows_out = len(merged)
+    """
+    current = Stage(name, rows_in)
+    if not _enabled:
+        yield current
+        return
+
+    stack = getattr(_stack, "stages", None)
+    if stack is None:
+        stack = _stack.stages = []
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        memory, peak = tracemalloc.get_traced_memory()
+        # reset_peak() below forgets the peak so far, so credit it to the
+        # enclosing stages first
+        for outer in stack:
+            outer.peak_memory = max(outer.peak_memory, peak - outer.memory_before)
+        current.memory_before = memory
+        tracemalloc.reset_peak()
+    current.max_rss_before = _max_rss_kb()
+    stack.append(current)
+    begin = time.perf_counter()
+    try:
+        yield current
+    finally:
+        end = time.perf_counter()
+        stack.pop()
+        if tracing:
+            peak = tracemalloc.get_traced_memory()[1]
+            current.peak_memory = max(current.peak_memory, peak - current.memory_before)
+            # The enclosing stages cannot see this stage's peak any more
+            absolute_peak = current.memory_before + current.peak_memory
+            for outer in stack:
+                outer.peak_memory = max(
+                    outer.peak_memory, absolute_peak - outer.memory_before
+                )
+        _record(current, begin, end)
+
+
+def _record(current, begin, end):
+    args = dict(current.args)
+    if current.rows_in is not None:
+        args["rows_in"] = current.rows_in
+    if current.rows_out is not None:
+        args["rows_out"] = current.rows_out
+    if tracemalloc.is_tracing():
+        args["peak_memory_bytes"] = current.peak_memory
+    max_rss = _max_rss_kb()
+    if max_rss is not None:
+        # ru_maxrss is the high-water mark of the whole process so far; the
+        # growth is how far this stage pushed it up
+        args["process_max_rss_kb"] = max_rss
+        args["max_rss_growth_kb"] = max_rss - current.max_rss_before
+    event = {
+        "name": current.name,
+        "ph": "X",
+        "ts": round((begin - _start) * 1e6, 1),
+        "dur": round((end - begin) * 1e6, 1),
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": args,
+    }
+    with _lock:
+        _events.append(event)
+
+
+def timed(name=None):
+    """Decorator that runs the wrapped function inside a stage."""
+
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with stage(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summary():
+    """Return total time, calls and rows per stage name, slowest first."""
+    totals = {}
+    with _lock:
+        events = list(_events)
+    for event in events:
+        total = totals.setdefault(
+            event["name"], {"calls": 0, "seconds": 0.0, "rows_out": 0}
+        )
+        total["calls"] += 1
+        total["seconds"] += event["dur"] / 1e6
+        total["rows_out"] += event["args"].get("rows_out") or 0
+    return sorted(totals.items(), key=lambda item: item[1]["seconds"], reverse=True)
+
+
+def write_trace(output_dir=None):
+    """
+    Write the recorded stages as a Chrome trace (chrome://tracing, Perfetto)
+    and the cProfile dump if enabled. Called automatically at exit.
+
+    Returns:
+        Path to the trace file, or None when profiling is disabled
+    """
+    global _profiler, _written
+    if not _enabled or _written:
+        return None
+    _written = True
+    output_dir = output_dir or os.environ.get(OUTPUT_DIR_ENV_VAR, DEFAULT_OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(output_dir, f"{_run_name}_{stamp}_{os.getpid()}")
+
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(f"{base}.prof")
+        _profiler = None
+
+    with _lock:
+        events = list(_events)
+    trace = {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {"run": _run_name, "argv": sys.argv, "options": sorted(_options)},
+    }
+    trace_file = f"{base}.trace.json"
+    with open(trace_file, "w") as f:
+        json.dump(trace, f)
+
+    print(f"\nProfile written to {trace_file}", file=sys.stderr)
+    for name, total in summary():
+        print(
+            f"  {name:<24} {total['seconds']:9.3f}s  calls={total['calls']}"
+            f"  rows_out={total['rows_out']}",
+            file=sys.stderr,
+        )
+    return trace_file
@@ -0,0 +1,256 @@
+import argparse
+import glob
+import os
+import numpy as np
+import pandas as pd
+from profiling import configure, stage, timed
+
+# Columnar copy of all price_gaps_*.csv files, rebuilt when any of them changes
+COLUMNS_CACHE = os.path.join("cache", "gap_columns.npz")
+
+GAP_COLUMNS = ["gap_open", "gap_high", "gap_low", "gap_close"]
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# SHFE night session (21:00 - 02:30) as minute-of-day bounds, everything
+# else is the day session
+NIGHT_START = 21 * 60
+NIGHT_END = 2 * 60 + 30
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+SESSIONS = ["day", "night"]
+
+MINUTES_PER_DAY = 24 * 60
+NS_PER_MINUTE = 60 * 1_000_000_000
+
+
+def _source_signature(files):
+    return [[f, os.path.getsize(f), os.stat(f).st_mtime_ns] for f in files]
+
+
+def load_gap_columns(results_dir="results", use_cache=True):
+    """
+    Load every price_gaps_*.csv file into flat numpy arrays.
+
+    The arrays are cached in cache/gap_columns.npz together with the size and
+    mtime of every source file, so repeated queries skip the CSV parsing.
+
+    Returns:
+        Dictionary with 'contracts' (names), 'contract' (int id per row),
+        'minutes' (minutes since the epoch per row) and one float array per
+        gap column
+    """
+    files = sorted(glob.glob(os.path.join(results_dir, "price_gaps_*.csv")))
+    signature = _source_signature(files)
+
+    if use_cache and os.path.exists(COLUMNS_CACHE):
+        with np.load(COLUMNS_CACHE, allow_pickle=False) as cached:
+            if str(cached["signature"]) == repr(signature):
+                return {k: cached[k] for k in cached.files if k != "signature"}
+
+    contracts, contract_ids, minutes, values = [], [], [], {c: [] for c in GAP_COLUMNS}
+    for i, file_path in enumerate(files):
+        with stage("read_csv") as s:
+            df = pd.read_csv(file_path)
+            s.rows_out = len(df)
+        timestamps = pd.to_datetime(df["DateTime"]).to_numpy(dtype="datetime64[ns]")
+        contracts.append(
+            os.path.basename(file_path).replace("price_gaps_", "").replace(".csv", "")
+        )
+        contract_ids.append(np.full(len(df), i, dtype=np.int32))
+        minutes.append(timestamps.view("int64") // NS_PER_MINUTE)
+        for col in GAP_COLUMNS:
+            values[col].append(df[col].to_numpy(dtype=np.float64))
+
+    data = {
+        "contracts": np.array(contracts, dtype=str),
+        "contract": np.concatenate(contract_ids or [np.empty(0, np.int32)]),
+        "minutes": np.concatenate(minutes or [np.empty(0, np.int64)]),
+    }
+    for col in GAP_COLUMNS:
+        data[col] = np.concatenate(values[col] or [np.empty(0)])
+
+    if use_cache:
+        os.makedirs(os.path.dirname(COLUMNS_CACHE), exist_ok=True)
+        np.savez(COLUMNS_CACHE, signature=np.array(repr(signature)), **data)
+    return data
+
+
+def bucket_ids(minutes, by):
+    """
+    Map minutes since the epoch to integer bucket ids.
+
+    Args:
+        minutes: int64 array of minutes since 1970-01-01
+        by: 'minute' (minute of day), 'session' (day/night), 'weekday' or
+            'weekday_minute' (weekday x minute of day)
+
+    Returns:
+        Tuple of (bucket id array, list of bucket labels)
+    """
+    minute_of_day = minutes % MINUTES_PER_DAY
+    if by == "minute":
+        labels = [f"{m // 60:02d}:{m % 60:02d}" for m in range(MINUTES_PER_DAY)]
+        return minute_of_day, labels
+    if by == "session":
+        night = (minute_of_day >= NIGHT_START) | (minute_of_day <= NIGHT_END)
+        return night.astype(np.int64), SESSIONS
+    # 1970-01-01 was a Thursday
+    weekday = (minutes // MINUTES_PER_DAY + 3) % 7
+    if by == "weekday":
+        return weekday, WEEKDAYS
+    if by == "weekday_minute":
+        labels = [
+            f"{day} {m // 60:02d}:{m % 60:02d}"
+            for day in WEEKDAYS
+            for m in range(MINUTES_PER_DAY)
+        ]
+        return weekday * MINUTES_PER_DAY + minute_of_day, labels
+    raise ValueError(f"Unknown bucket type {by!r}")
+
+
+def aggregate(ids, values, n_buckets, quantiles=QUANTILES):
+    """
+    Count, mean, sample variance and quantiles of values per bucket id.
+
+    Sums use np.bincount; quantiles come from a single sort by (id, value)
+    and interpolation at per-bucket offsets, so the cost does not depend on
+    the number of buckets.
+
+    Returns:
+        Dictionary of arrays of length n_buckets: 'count', 'mean', 'var' and
+        'q<percent>' for every quantile (NaN for empty buckets)
+    """
+    valid = ~np.isnan(values)
+    ids, values = ids[valid], values[valid]
+
+    count = np.bincount(ids, minlength=n_buckets)
+    total = np.bincount(ids, weights=values, minlength=n_buckets)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        # Center on the bucket mean before squaring to avoid cancellation
+        centered = values - mean[ids]
+        sq = np.bincount(ids, weights=centered * centered, minlength=n_buckets)
+        var = np.where(count > 1, sq / (count - 1), np.nan)
+
+    result = {"count": count, "mean": mean, "var": var}
+
+    order = np.lexsort((values, ids))
+    sorted_values = values[order]
+    offsets = np.cumsum(count) - count
+    nonempty = count > 0
+    for q in quantiles:
+        # Linear interpolation between the closest ranks, as numpy.quantile
+        pos = q * (count[nonempty] - 1)
+        lower = np.floor(pos)
+        frac = pos - lower
+        lo = offsets[nonempty] + lower.astype(np.int64)
+        hi = lo + (frac > 0)
+        quantile = np.full(n_buckets, np.nan)
+        quantile[nonempty] = (
+            sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * frac
+        )
+        result[f"q{round(q * 100):02d}"] = quantile
+    return result
+
+
+@timed()
+def gap_profile(by="minute", column="gap_close", data=None, results_dir="results"):
+    """
+    Profile a gap column per bucket for every contract and for all contracts
+    combined.
+
+    Returns:
+        DataFrame with columns Contract, bucket, label, count, mean, std, var
+        and the quantiles; empty buckets are left out
+    """
+    if data is None:
+        data = load_gap_columns(results_dir)
+    contracts = list(data["contracts"]) + ["ALL"]
+    buckets, labels = bucket_ids(data["minutes"], by)
+    n_labels = len(labels)
+    values = data[column]
+
+    # One pass over all contracts: contract k uses ids k * n_labels + bucket,
+    # the combined profile is appended as an extra pseudo contract
+    ids = np.concatenate(
+        [
+            data["contract"].astype(np.int64) * n_labels + buckets,
+            (len(contracts) - 1) * n_labels + buckets,
+        ]
+    )
+    with stage("aggregate", rows_in=len(ids)):
+        stats = aggregate(
+            ids, np.concatenate([values, values]), len(contracts) * n_labels
+        )
+
+    profile = pd.DataFrame(stats)
+    profile.insert(0, "Contract", np.repeat(contracts, n_labels))
+    profile.insert(1, "bucket", np.tile(np.arange(n_labels), len(contracts)))
+    profile.insert(2, "label", np.tile(labels, len(contracts)))
+    profile.insert(5, "std", np.sqrt(profile["var"]))
+    return profile[profile["count"] > 0].reset_index(drop=True)
+
+
+def profile_table(profile, value="mean"):
+    """
+    Pivot a profile into a Contract x bucket table for heatmaps. For
+    weekday_minute profiles use weekday_table instead.
+    """
+    table = profile.pivot(index="Contract", columns="bucket", values=value)
+    labels = profile.drop_duplicates("bucket").set_index("bucket")["label"]
+    table.columns = labels.loc[table.columns].to_numpy()
+    return table
+
+
+def weekday_table(profile, contract="ALL", value="mean"):
+    """Pivot a weekday_minute profile of one contract into a weekday x minute table."""
+    rows = profile[profile["Contract"] == contract]
+    weekday = rows["bucket"] // MINUTES_PER_DAY
+    minute = rows["bucket"] % MINUTES_PER_DAY
+    table = pd.DataFrame(
+        {"weekday": weekday, "minute": minute, value: rows[value]}
+    ).pivot(index="weekday", columns="minute", values=value)
+    table.index = [WEEKDAYS[d] for d in table.index]
+    table.columns = [f"{m // 60:02d}:{m % 60:02d}" for m in table.columns]
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Intraday seasonality and session profiles of price gaps"
+    )
+    parser.add_argument(
+        "--by",
+        choices=["minute", "session", "weekday", "weekday_minute"],
+        default="minute",
+    )
+    parser.add_argument("--column", choices=GAP_COLUMNS, default="gap_close")
+    parser.add_argument(
+        "--value", default="mean", help="Statistic to plot, e.g. mean, std, q50"
+    )
+    parser.add_argument("--no-plot", action="store_true")
+    args = parser.parse_args(argv)
+
+    profile = gap_profile(args.by, args.column)
+    os.makedirs("results", exist_ok=True)
+    output_file = f"results/profile_{args.by}_{args.column}.csv"
+    profile.to_csv(output_file, index=False)
+    print(f"Profile with {len(profile)} buckets saved to '{output_file}'")
+
+    if not args.no_plot:
+        from plot import plot_profile_heatmap
+
+        if args.by == "weekday_minute":
+            table = weekday_table(profile, value=args.value)
+        else:
+            table = profile_table(profile, value=args.value)
+        plot_profile_heatmap(
+            table,
+            f"{args.column} {args.value} by {args.by.replace('_', ' x ')}",
+            f"figs/profile_{args.by}_{args.column}_{args.value}.png",
+        )
+
+
+if __name__ == "__main__":
+    configure()
+    main()
@@ -0,0 +1,608 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+# pandas, cal_gap and t_test are imported on first use so the service starts
+# quickly; all pandas work runs in a thread pool off the event loop.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_MB = 512
+
+# Same instruments as the demo.py display
+LIVE_PRODUCTS = ["AU2412.SHF", "SPTAUUSDOZ.IDC"]
+
+GAP_COLUMNS = ["gap_open", "gap_high", "gap_low", "gap_close"]
+AGGREGATIONS = {"last", "first", "mean", "min", "max", "median"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class LRUCache:
+    """Least recently used cache bounded by the total size of its values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key, value, size):
+        if key in self._items:
+            self.size -= self._items.pop(key)[1]
+        self._items[key] = (value, size)
+        self.size += size
+        # Always keep the newest entry, even if it is larger than the budget
+        while self.size > self.max_bytes and len(self._items) > 1:
+            _, (_, evicted_size) = self._items.popitem(last=False)
+            self.size -= evicted_size
+
+    def info(self):
+        return {
+            "entries": len(self._items),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _frame_size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class GapStore:
+    """
+    Gap series, query results and t-test statistics shared by all clients.
+
+    Every value is computed at most once per version of its results file:
+    concurrent requests for the same key wait for the computation already in
+    flight instead of starting their own.
+    """
+
+    def __init__(self, results_dir="results", max_bytes=DEFAULT_CACHE_MB << 20):
+        self.results_dir = results_dir
+        self.cache = LRUCache(max_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+        self._inflight = {}
+
+    def gap_file(self, contract):
+        return f"{self.results_dir}/price_gaps_{contract}.csv"
+
+    def _version(self, contract):
+        try:
+            return os.stat(self.gap_file(contract)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    async def _single_flight(self, key, compute):
+        """Run compute in the thread pool, sharing one run between callers."""
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, compute)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _cached(self, key, compute, size):
+        value = self.cache.get(key)
+        if value is None:
+            value = await self._single_flight(key, compute)
+            self.cache.put(key, value, size(value))
+        return value
+
+    async def frame(self, contract):
+        """Gap series of a contract indexed by DateTime, computed if missing."""
+        version = self._version(contract)
+        if version is None:
+            await self._single_flight(
+                ("compute", contract), lambda: self._compute(contract)
+            )
+            version = self._version(contract)
+        return await self._cached(
+            ("frame", contract, version),
+            lambda: self._load(contract),
+            _frame_size,
+        )
+
+    def _compute(self, contract):
+        from cal_gap import calculate_gap, calculate_gc_gap
+
+        if not os.path.exists(f"data/{contract}.csv"):
+            raise HTTPError(404, f"Unknown contract {contract}")
+        calculate = calculate_gc_gap if contract.startswith("GC") else calculate_gap
+        calculate(contract)
+        return True
+
+    def _load(self, contract):
+        import pandas as pd
+
+        df = pd.read_csv(self.gap_file(contract), parse_dates=["DateTime"])
+        return df.set_index("DateTime").sort_index()
+
+    async def query(
+        self, contract, start=None, end=None, columns=None, freq=None, agg="last"
+    ):
+        """
+        JSON encoded gaps of a contract between start and end (inclusive),
+        optionally restricted to some columns and downsampled to freq.
+        """
+        columns = tuple(columns or GAP_COLUMNS)
+        unknown = [c for c in columns if c not in GAP_COLUMNS]
+        if unknown:
+            raise HTTPError(400, f"Unknown columns {', '.join(unknown)}")
+        if agg not in AGGREGATIONS:
+            raise HTTPError(
+                400, f"agg must be one of {', '.join(sorted(AGGREGATIONS))}"
+            )
+
+        df = await self.frame(contract)
+        key = (
+            "query",
+            contract,
+            self._version(contract),
+            start,
+            end,
+            columns,
+            freq,
+            agg,
+        )
+        return await self._cached(
+            key,
+            lambda: self._encode(contract, df, start, end, list(columns), freq, agg),
+            len,
+        )
+
+    def _encode(self, contract, df, start, end, columns, freq, agg):
+        import pandas as pd
+
+        try:
+            start = pd.Timestamp(start) if start else None
+            end = pd.Timestamp(end) if end else None
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        # The index is sorted, so this is a binary search rather than a scan
+        selected = df.loc[start:end, columns]
+        if freq:
+            try:
+                selected = selected.resample(freq).agg(agg).dropna(how="all")
+            except ValueError as e:
+                raise HTTPError(400, f"Invalid freq {freq!r}: {e}")
+        header = json.dumps(
+            {
+                "contract": contract,
+                "columns": ["DateTime"] + columns,
+                "rows": len(selected),
+            },
+            separators=(",", ":"),
+        )
+        data = selected.reset_index().to_json(
+            orient="values", date_format="iso", date_unit="s"
+        )
+        # Splice the rows into the header object instead of re-encoding them
+        return f'{header[:-1]},"data":{data}}}'.encode()
+
+    async def stats(self, contract):
+        """JSON encoded t-test results for a contract."""
+        df = await self.frame(contract)
+
+        def compute():
+            from t_test import t_test_frame
+
+            results = t_test_frame(df, contract)
+            return json.dumps(
+                {k: (None if v != v else v) for k, v in results.items()}
+            ).encode()
+
+        return await self._cached(
+            ("stats", contract, self._version(contract)), compute, len
+        )
+
+    def contracts(self):
+        if not os.path.isdir(self.results_dir):
+            return []
+        prefix, suffix = "price_gaps_", ".csv"
+        return sorted(
+            f[len(prefix) : -len(suffix)]
+            for f in os.listdir(self.results_dir)
+            if f.startswith(prefix) and f.endswith(suffix)
+        )
+
+
+class QuoteFeed:
+    """Latest quote snapshot, published by a quote source to any number of streams."""
+
+    def __init__(self):
+        self.snapshot = None
+        self.version = 0
+        self.closed = False
+        # Task running the quote source; the event loop only keeps a weak
+        # reference to tasks
+        self.task = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, snapshot):
+        async with self._changed:
+            self.snapshot = snapshot
+            self.version += 1
+            self._changed.notify_all()
+
+    async def close(self):
+        """Mark the end of the stream, e.g. when a replay file is exhausted."""
+        async with self._changed:
+            self.closed = True
+            self._changed.notify_all()
+
+    async def wait(self, version):
+        """
+        Wait for a snapshot newer than version.
+
+        Returns:
+            (version, snapshot), with snapshot None once the feed is closed
+        """
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.version > version or self.closed)
+            if self.version > version:
+                return self.version, self.snapshot
+            return version, None
+
+
+def start_wind_feed(feed, loop):
+    """Subscribe to real-time quotes through WindPy, like demo.py does."""
+    from WindPy import w
+
+    if w.start().ErrorCode != 0:
+        raise RuntimeError("WindPy start failed")
+    quotes = {
+        prod: {"Bid": None, "Ask": None, "Latest": None} for prod in LIVE_PRODUCTS
+    }
+
+    def callback(indata):
+        if indata.ErrorCode != 0:
+            print("Error code:", indata.ErrorCode, file=sys.stderr)
+            return
+        for i, code in enumerate(indata.Codes):
+            quotes[code]["Latest"] = indata.Data[indata.Fields.index("RT_LATEST")][i]
+            quotes[code]["Bid"] = indata.Data[indata.Fields.index("RT_BID1")][i]
+            quotes[code]["Ask"] = indata.Data[indata.Fields.index("RT_ASK1")][i]
+        snapshot = {
+            "Time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            **{
+                f"{prod}_{field}": value
+                for prod, fields in quotes.items()
+                for field, value in fields.items()
+            },
+        }
+        asyncio.run_coroutine_threadsafe(feed.publish(snapshot), loop)
+
+    w.wsq(",".join(LIVE_PRODUCTS), "rt_latest,rt_bid1,rt_ask1", func=callback)
+
+
+async def replay_feed(feed, file_path, interval=1.0):
+    """Publish the rows of a file saved by demo.py as live snapshots."""
+    import csv
+
+    with open(file_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    try:
+        for row in rows:
+            await feed.publish(row)
+            await asyncio.sleep(interval)
+    finally:
+        await feed.close()
+
+
+class GapServer:
+    """Minimal HTTP/1.1 server with keep-alive on top of asyncio streams."""
+
+    def __init__(self, store, feed=None):
+        self.store = store
+        self.feed = feed
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._send(writer, 400, b'{"error":"Bad request"}', False)
+                    break
+                keep_alive = headers.get("connection", "").lower() != "close" and (
+                    version == "HTTP/1.1"
+                )
+                self.requests += 1
+                if not await self.dispatch(method, target, writer, keep_alive):
+                    break
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, writer, keep_alive):
+        """Answer one request; returns False when the connection must close."""
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            if method != "GET":
+                raise HTTPError(405, "Only GET is supported")
+            if url.path == "/live":
+                await self._stream_live(writer, params)
+                return False
+            body = await self.route(url.path, params)
+            status = 200
+        except HTTPError as e:
+            status, body = e.status, json.dumps({"error": e.message}).encode()
+        except Exception as e:  # keep serving other clients
+            status, body = 500, json.dumps({"error": repr(e)}).encode()
+        await self._send(writer, status, body, keep_alive)
+        return True
+
+    async def route(self, path, params):
+        if path == "/gaps":
+            contract = self._contract(params)
+            columns = params.get("columns")
+            return await self.store.query(
+                contract,
+                start=params.get("start"),
+                end=params.get("end"),
+                columns=columns.split(",") if columns else None,
+                freq=params.get("freq"),
+                agg=params.get("agg", "last"),
+            )
+        if path == "/stats":
+            return await self.store.stats(self._contract(params))
+        if path == "/contracts":
+            return json.dumps(self.store.contracts()).encode()
+        if path == "/health":
+            return json.dumps(
+                {"requests": self.requests, "cache": self.store.cache.info()}
+            ).encode()
+        raise HTTPError(404, f"Unknown path {path}")
+
+    @staticmethod
+    def _contract(params):
+        contract = params.get("contract")
+        if not contract or not contract.replace(".", "").isalnum():
+            raise HTTPError(400, "contract parameter is required")
+        return contract
+
+    async def _stream_live(self, writer, params):
+        """Stream quote snapshots as newline delimited JSON until the client leaves."""
+        if self.feed is None:
+            raise HTTPError(503, "No live quote source, start with --live")
+        # Validate everything before the headers go out; an error after that
+        # point can no longer be reported as a status code
+        try:
+            limit = int(params.get("limit", 0))
+        except ValueError:
+            raise HTTPError(400, f"Invalid limit {params['limit']!r}")
+        if limit < 0:
+            raise HTTPError(400, f"Invalid limit {limit}")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n"
+        )
+        version = 0
+        sent = 0
+        while not limit or sent < limit:
+            version, snapshot = await self.feed.wait(version)
+            if snapshot is None:
+                break
+            line = json.dumps(snapshot).encode() + b"\n"
+            writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+            await writer.drain()
+            sent += 1
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _send(writer, status, body, keep_alive):
+        reason = {
+            200: "OK",
+            400: "Bad Request",
+            404: "Not Found",
+            405: "Method Not Allowed",
+            503: "Service Unavailable",
+        }.get(status, "Internal Server Error")
+        connection = b"keep-alive" if keep_alive else b"close"
+        writer.write(
+            b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n"
+            b"Content-Length: %d\r\nConnection: %s\r\n\r\n"
+            % (status, reason.encode(), len(body), connection)
+            + body
+        )
+        await writer.drain()
+
+
+async def serve(
+    host=DEFAULT_HOST,
+    port=DEFAULT_PORT,
+    unix=None,
+    cache_mb=DEFAULT_CACHE_MB,
+    live=None,
+):
+    store = GapStore(max_bytes=cache_mb << 20)
+    feed = None
+    if live:
+        feed = QuoteFeed()
+        if live == "wind":
+            start_wind_feed(feed, asyncio.get_running_loop())
+        elif live.startswith("replay:"):
+            feed.task = asyncio.create_task(replay_feed(feed, live[len("replay:") :]))
+        else:
+            raise ValueError(f"Unknown live source {live!r}")
+    app = GapServer(store, feed)
+    if unix:
+        server = await asyncio.start_unix_server(app.handle, path=unix)
+        print(f"Serving gaps on unix socket {unix}")
+    else:
+        server = await asyncio.start_server(app.handle, host, port)
+        print(f"Serving gaps on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+async def _client(host, port, unix, paths, latencies, errors):
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            begin = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - begin)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def benchmark(
+    contract, host=DEFAULT_HOST, port=DEFAULT_PORT, unix=None, clients=32, requests=2000
+):
+    """
+    Measure throughput and latency of a running service with concurrent
+    keep-alive clients issuing a mix of range, downsampled and stats queries.
+    """
+    queries = [
+        f"/gaps?contract={contract}&freq=1h&columns=gap_close",
+        f"/gaps?contract={contract}&freq=1D&agg=mean",
+        f"/gaps?contract={contract}&freq=5min&columns=gap_open,gap_close",
+        f"/stats?contract={contract}",
+    ]
+    per_client = max(1, requests // clients)
+    latencies, errors = [], []
+    begin = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _client(
+                host,
+                port,
+                unix,
+                [queries[(c + i) % len(queries)] for i in range(per_client)],
+                latencies,
+                errors,
+            )
+            for c in range(clients)
+        )
+    )
+    elapsed = time.perf_counter() - begin
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    print(
+        f"{len(latencies)} requests from {clients} clients in {elapsed:.2f}s: "
+        f"{len(latencies) / elapsed:.0f} req/s, "
+        f"p50 {pct(50):.2f} ms, p95 {pct(95):.2f} ms, p99 {pct(99):.2f} ms, "
+        f"errors {len(errors)}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local gap query service")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=None, help="Serve on a Unix socket instead")
+    # The address options are also accepted after the subcommand; SUPPRESS
+    # keeps the subcommand from overwriting values given before it
+    address = argparse.ArgumentParser(add_help=False)
+    address.add_argument("--host", default=argparse.SUPPRESS)
+    address.add_argument("--port", type=int, default=argparse.SUPPRESS)
+    address.add_argument("--unix", default=argparse.SUPPRESS)
+    sub = parser.add_subparsers(dest="command")
+
+    serve_parser = sub.add_parser(
+        "serve", parents=[address], help="Run the service (default)"
+    )
+    serve_parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_MB)
+    serve_parser.add_argument(
+        "--live",
+        default=None,
+        help="Quote source for /live: 'wind' or 'replay:<market_data csv>'",
+    )
+
+    bench_parser = sub.add_parser(
+        "bench", parents=[address], help="Benchmark a running service"
+    )
+    bench_parser.add_argument("contract")
+    bench_parser.add_argument("--clients", type=int, default=32)
+    bench_parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "bench":
+            asyncio.run(
+                benchmark(
+                    args.contract,
+                    args.host,
+                    args.port,
+                    args.unix,
+                    clients=args.clients,
+                    requests=args.requests,
+                )
+            )
+        else:
+            asyncio.run(
+                serve(
+                    args.host,
+                    args.port,
+                    args.unix,
+                    cache_mb=getattr(args, "cache_mb", DEFAULT_CACHE_MB),
+                    live=getattr(args, "live", None),
+                )
+            )
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,8 +4,10 @@ import glob
 import os
 from scipy import stats
 import tabulate
+from profiling import configure, stage, timed
 
 
+@timed()
 def perform_t_test(file_path):
     """
     Perform t-test for gap = 0 for all price types in the given file.
@@ -22,47 +24,72 @@ def perform_t_test(file_path):
     )
 
     # Read the gap data
-    df = pd.read_csv(file_path)
+    with stage("read_csv") as s:
+        df = pd.read_csv(file_path)
+        s.rows_out = len(df)
 
+    return t_test_frame(df, contract_name)
+
+
+def t_test_frame(df, contract_name):
+    """
+    Perform t-test for gap = 0 for all price types in a DataFrame of gaps.
+
+    Args:
+        df: DataFrame with gap_open, gap_high, gap_low and gap_close columns
+        contract_name: Contract code stored in the results
+
+    Returns:
+        Dictionary containing t-test results for each price type
+    """
     # Dictionary to store results
     results = {"Contract": contract_name}
 
     # Perform t-test for each price type
-    for price_type in ["open", "high", "low", "close"]:
-        gap_column = f"gap_{price_type}"
-
-        # Calculate statistics
-        mean = df[gap_column].mean()
-        std_dev = df[gap_column].std()
-        n = len(df[gap_column])
-        std_err = std_dev / np.sqrt(n)
-
-        # Calculate t-statistic manually for large sample sizes
-        t_stat = mean / std_err if std_err != 0 else np.nan
-
-        # Calculate p-value (two-tailed test)
-        # For large sample sizes, we can use normal distribution approximation
-        if not np.isnan(t_stat):
-            p_value = 2 * (1 - stats.norm.cdf(abs(t_stat)))
-        else:
-            p_value = np.nan
-
-        # Store results
-        results[f"{price_type}_mean"] = mean
-        results[f"{price_type}_std_dev"] = std_dev
-        results[f"{price_type}_std_err"] = std_err
-        results[f"{price_type}_t_stat"] = t_stat
-        results[f"{price_type}_p_value"] = p_value
+    with stage("t_stats", rows_in=len(df)):
+        for price_type in ["open", "high", "low", "close"]:
+            gap_column = f"gap_{price_type}"
+
+            # Calculate statistics
+            mean = df[gap_column].mean()
+            std_dev = df[gap_column].std()
+            n = len(df[gap_column])
+            std_err = std_dev / np.sqrt(n)
+
+            # Calculate t-statistic manually for large sample sizes
+            t_stat = mean / std_err if std_err != 0 else np.nan
+
+            # Calculate p-value (two-tailed test)
+            # For large sample sizes, we can use normal distribution approximation
+            if not np.isnan(t_stat):
+                p_value = 2 * (1 - stats.norm.cdf(abs(t_stat)))
+            else:
+                p_value = np.nan
+
+            # Store results
+            results[f"{price_type}_mean"] = mean
+            results[f"{price_type}_std_dev"] = std_dev
+            results[f"{price_type}_std_err"] = std_err
+            results[f"{price_type}_t_stat"] = t_stat
+            results[f"{price_type}_p_value"] = p_value
 
     return results
 
 
-def main():
+def main(gap_files=None):
+    """
+    Run the t-tests and save the AU and GC result tables.
+
+    Args:
+        gap_files: Price gap CSV files to test, defaults to every
+            results/price_gaps_*.csv file
+    """
     # Create results directory if it doesn't exist
     os.makedirs("results", exist_ok=True)
 
     # Get all price gap files
-    gap_files = glob.glob("results/price_gaps_*.csv")
+    if gap_files is None:
+        gap_files = glob.glob("results/price_gaps_*.csv")
 
     # Separate AU and GC files
     au_files = [f for f in gap_files if "AU" in f]
@@ -98,8 +125,9 @@ def main():
     print_results_table(gc_df)
 
     # Save results to CSV
-    au_df.to_csv("results/au_t_test_results.csv", index=False)
-    gc_df.to_csv("results/gc_t_test_results.csv", index=False)
+    with stage("to_csv", rows_in=len(au_df) + len(gc_df)):
+        au_df.to_csv("results/au_t_test_results.csv", index=False)
+        gc_df.to_csv("results/gc_t_test_results.csv", index=False)
 
     print(
         "\nResults saved to 'results/au_t_test_results.csv' and 'results/gc_t_test_results.csv'"
@@ -157,4 +185,5 @@ def print_results_table(df):
 
 
 if __name__ == "__main__":
+    configure()
     main()
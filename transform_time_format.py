@@ -1,47 +1,282 @@
 import os
-import pandas as pd
-from datetime import datetime
+import argparse
+import fnmatch
+import glob
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
+# pandas is imported inside the functions that need it so that ingest_path()
+# stays cheap for the CLI and the pipeline runner
 
-def transform_datetime_format(input_file, output_file):
+# Normalized copies of the raw exports live here; readers prefer them over data/
+INGEST_CACHE_DIR = os.path.join("cache", "ingest")
+
+# Timezone all timestamps are normalized to (Wind terminal / SHFE local time)
+TARGET_TZ = "Asia/Shanghai"
+
+# Timezone of naive timestamps by file name pattern, first match wins; "local"
+# (or no match) leaves naive timestamps as they are. Every export in data/,
+# including the Wind E.CMX files, is already in local time, so nothing is
+# converted by default. Exchange-local exports need an explicit
+# --source-tz, e.g. 'GC*.csv=America/Chicago'.
+SOURCE_TIMEZONES = []
+
+OUTPUT_FORMAT = "%Y-%m-%d %H:%M:%S"
+OUTPUT_DATE_FORMAT = "%Y-%m-%d"
+
+# Candidate formats, most common first. Wind exports use '-' or '/' separators,
+# CME exports use month-first dates and may carry a UTC offset.
+CANDIDATE_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d",
+    "%Y-%m-%d %H:%M",
+    "%Y%m%d %H:%M:%S",
+    "%Y%m%d",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%Y-%m-%d %H:%M:%S%z",
+    "%Y-%m-%dT%H:%M:%SZ",
+]
+
+SAMPLE_ROWS = 200
+CHUNK_SIZE = 200_000
+
+
+def detect_datetime_format(input_file, column="DateTime", sample_rows=SAMPLE_ROWS):
+    """
+    Detect the timestamp format and timezone of a CSV file from a sample of rows.
+
+    Args:
+        input_file (str): Path to the CSV file
+        column (str): Name of the timestamp column
+        sample_rows (int): Number of leading rows to sample
+
+    Returns:
+        Tuple of (format string, source timezone or None for naive timestamps)
+    """
+    import pandas as pd
+
+    sample = pd.read_csv(input_file, usecols=[column], nrows=sample_rows, dtype=str)[
+        column
+    ].dropna()
+    if sample.empty:
+        raise ValueError(f"No {column} values found in {input_file}")
+
+    for fmt in CANDIDATE_FORMATS:
+        parsed = pd.to_datetime(sample, format=fmt, errors="coerce", utc="%z" in fmt)
+        if parsed.notna().all():
+            if "%z" in fmt or fmt.endswith("Z"):
+                return fmt, "UTC"
+            return fmt, None
+
+    raise ValueError(
+        f"Could not detect {column} format in {input_file} (sample: {sample.iloc[0]!r})"
+    )
+
+
+def resolve_source_tz(input_file, source_timezones=SOURCE_TIMEZONES):
+    """
+    Return the timezone of naive timestamps in input_file, or None if they are
+    already local time.
+
+    Args:
+        input_file (str): Path to the CSV file
+        source_timezones (list): (file name pattern, timezone) pairs, first
+            match wins; timezone "local" means no conversion
+    """
+    name = os.path.basename(input_file)
+    for pattern, tz in source_timezones:
+        if fnmatch.fnmatch(name, pattern):
+            return None if tz == "local" else tz
+    return None
+
+
+def _normalize_column(values, fmt, source_tz, target_tz, date_only):
+    import pandas as pd
+
+    parsed = pd.to_datetime(values, format=fmt, utc=source_tz == "UTC")
+    if source_tz is not None:
+        if source_tz != "UTC":
+            parsed = parsed.dt.tz_localize(source_tz)
+        parsed = parsed.dt.tz_convert(target_tz).dt.tz_localize(None)
+    return parsed.dt.strftime(OUTPUT_DATE_FORMAT if date_only else OUTPUT_FORMAT)
+
+
+def transform_datetime_format(
+    input_file,
+    output_file,
+    column="DateTime",
+    source_tz=None,
+    target_tz=TARGET_TZ,
+    chunksize=CHUNK_SIZE,
+):
     """
-    Transform the DateTime format in CSV files from 'YYYY/MM/DD HH:MM' to 'YYYY-MM-DD HH:MM:SS'
+    Normalize the DateTime column of a CSV file to 'YYYY-MM-DD HH:MM:SS'
+    ('YYYY-MM-DD' for daily data) in the target timezone.
+
+    The input format is detected from a sample, then the file is converted in
+    chunks with a vectorized parser and written atomically to output_file.
 
     Args:
         input_file (str): Path to the input CSV file
         output_file (str): Path to the output CSV file
+        column (str): Name of the timestamp column
+        source_tz (str): Timezone of naive timestamps; None leaves them as-is
+        target_tz (str): Timezone the output timestamps are expressed in
+        chunksize (int): Number of rows converted per chunk
+
+    Returns:
+        Number of rows written
     """
+    import pandas as pd
+
     print(f"Processing {input_file}...")
 
-    # Read the CSV file
-    df = pd.read_csv(input_file)
+    fmt, detected_tz = detect_datetime_format(input_file, column)
+    source_tz = detected_tz or source_tz
+    date_only = "%H" not in fmt
 
-    # Convert DateTime column to the new format
-    df["DateTime"] = df["DateTime"].apply(
-        lambda x: datetime.strptime(x, "%Y/%m/%d %H:%M").strftime("%Y-%m-%d %H:%M:00")
-    )
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    tmp_file = f"{output_file}.tmp"
+    rows = 0
+    try:
+        with open(tmp_file, "w", newline="") as out:
+            reader = pd.read_csv(
+                input_file,
+                chunksize=chunksize,
+                dtype={column: str},
+                encoding_errors="replace",
+            )
+            for i, chunk in enumerate(reader):
+                chunk[column] = _normalize_column(
+                    chunk[column], fmt, source_tz, target_tz, date_only
+                )
+                chunk.to_csv(out, index=False, header=i == 0)
+                rows += len(chunk)
+        os.replace(tmp_file, output_file)
+    finally:
+        # Never leave a partial file behind, e.g. when a later chunk does not
+        # match the sampled format
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
 
-    # Save the transformed data to a new CSV file
-    df.to_csv(output_file, index=False)
+    print(f"Normalized {rows} rows ({fmt}) saved to {output_file}")
+    return rows
 
-    print(f"Transformed data saved to {output_file}")
 
+def ingest_path(name, data_dir="data", cache_dir=INGEST_CACHE_DIR):
+    """
+    Return the path to read for data file `name` (without extension).
 
-def main():
-    # Input files
-    input_files = ["data/GCM24E.CMX.csv", "data/GCZ23E.CMX.csv"]
+    The normalized copy in the ingest cache is used when it exists and is at
+    least as new as the raw export; otherwise the raw file in data_dir is used.
+    """
+    raw = os.path.join(data_dir, f"{name}.csv")
+    cached = os.path.join(cache_dir, f"{name}.csv")
+    if os.path.exists(cached) and (
+        not os.path.exists(raw) or os.path.getmtime(cached) >= os.path.getmtime(raw)
+    ):
+        return cached
+    return raw
+
+
+def _transform_one(args):
+    input_file, output_file, source_tz, chunksize = args
+    try:
+        rows = transform_datetime_format(
+            input_file, output_file, source_tz=source_tz, chunksize=chunksize
+        )
+    except Exception as e:
+        # Report the file and carry on with the rest of the directory
+        print(f"Failed to normalize {input_file}: {e}")
+        return input_file, None
+    return input_file, rows
 
-    output_dir = "data"
 
-    # Process each input file
-    for input_file in input_files:
-        # Generate output file name
-        file_name = os.path.basename(input_file).replace(".csv", "_transformed.csv")
-        output_file = os.path.join(output_dir, file_name)
+def transform_directory(
+    input_dir="data",
+    output_dir=INGEST_CACHE_DIR,
+    pattern="*.csv",
+    source_timezones=SOURCE_TIMEZONES,
+    chunksize=CHUNK_SIZE,
+    workers=None,
+):
+    """
+    Normalize every CSV file in input_dir into output_dir, one process per file.
+
+    The timezone of naive timestamps is resolved per file from
+    source_timezones (see resolve_source_tz).
+
+    Returns:
+        Dictionary mapping input file to number of rows written, None for
+        files that failed
+    """
+    input_files = sorted(glob.glob(os.path.join(input_dir, pattern)))
+    jobs = [
+        (
+            f,
+            os.path.join(output_dir, os.path.basename(f)),
+            resolve_source_tz(f, source_timezones),
+            chunksize,
+        )
+        for f in input_files
+    ]
+    if not jobs:
+        print(f"No files matching {pattern} in {input_dir}")
+        return {}
+
+    if workers == 1 or len(jobs) == 1:
+        return dict(map(_transform_one, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(_transform_one, jobs))
+
 
-        # Transform the file
-        transform_datetime_format(input_file, output_file)
+def main():
+    parser = argparse.ArgumentParser(
+        description="Normalize DateTime columns of raw exports into the ingest cache"
+    )
+    parser.add_argument("input_dir", nargs="?", default="data")
+    parser.add_argument("--output-dir", default=INGEST_CACHE_DIR)
+    parser.add_argument("--pattern", default="*.csv")
+    parser.add_argument(
+        "--source-tz",
+        action="append",
+        default=[],
+        metavar="PATTERN=TZ",
+        help="Timezone of naive timestamps in files matching PATTERN, e.g. "
+        "'GC*.csv=America/Chicago'; may be repeated, first match wins. Naive "
+        "timestamps are left in local time by default",
+    )
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    source_timezones = []
+    for option in args.source_tz:
+        pattern, sep, tz = option.partition("=")
+        if not sep or not pattern or not tz:
+            parser.error(f"--source-tz expects PATTERN=TZ, got {option!r}")
+        source_timezones.append((pattern, tz))
+
+    results = transform_directory(
+        args.input_dir,
+        args.output_dir,
+        pattern=args.pattern,
+        source_timezones=source_timezones + SOURCE_TIMEZONES,
+        chunksize=args.chunksize,
+        workers=args.workers,
+    )
+    failed = [f for f, rows in results.items() if rows is None]
+    if failed:
+        print(f"{len(failed)} of {len(results)} files failed: {', '.join(failed)}")
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
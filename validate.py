@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+# SHFE gold trading sessions as (start, end) minute-of-day, both inclusive.
+# The night session wraps past midnight and is split in two windows.
+SHFE_SESSIONS = [
+    (21 * 60, 24 * 60 - 1),  # 21:00 - 23:59
+    (0, 2 * 60 + 30),  # 00:00 - 02:30
+    (9 * 60, 10 * 60 + 15),  # 09:00 - 10:15
+    (10 * 60 + 30, 11 * 60 + 30),  # 10:30 - 11:30
+    (13 * 60 + 30, 15 * 60),  # 13:30 - 15:00
+]
+
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+
+# A bar is flagged as an outlier when its close-to-close log return is more
+# than this many robust standard deviations (MAD based) away from the median
+OUTLIER_THRESHOLD = 30.0
+
+
+def _in_sessions(minute_of_day, sessions):
+    mask = np.zeros(len(minute_of_day), dtype=bool)
+    for start, end in sessions:
+        mask |= (minute_of_day >= start) & (minute_of_day <= end)
+    return mask
+
+
+def validate_bars(df, name="", sessions=None, outlier_threshold=OUTLIER_THRESHOLD):
+    """
+    Validate a DataFrame of bars keyed by a DateTime column in a single pass.
+
+    Checks for duplicated and out-of-order timestamps, missing bars inside the
+    trading sessions, OHLC consistency and price outliers. The returned frame
+    is sorted by DateTime with duplicated timestamps (keeping the last one),
+    unparseable timestamps and inconsistent OHLC rows removed, so it can be
+    joined with other validated frames without multiplying rows.
+
+    Args:
+        df: DataFrame with a DateTime column (str or datetime64)
+        name: Name of the data set, used in the report
+        sessions: List of (start, end) minute-of-day windows; None skips the
+            session calendar checks (e.g. for daily data)
+        outlier_threshold: Robust z-score above which a return is an outlier
+
+    Returns:
+        Tuple of (cleaned DataFrame, report dictionary)
+    """
+    df = df.copy()
+    df["DateTime"] = pd.to_datetime(df["DateTime"], errors="coerce")
+    report = {"name": name, "rows_in": len(df)}
+
+    invalid_time = df["DateTime"].isna().to_numpy()
+    report["invalid_timestamps"] = int(invalid_time.sum())
+
+    ts = df["DateTime"].to_numpy(dtype="datetime64[ns]")
+    ts_int = ts.view("int64")
+    valid_ts = ts_int[~invalid_time]
+    report["monotonic"] = bool(np.all(np.diff(valid_ts) >= 0))
+
+    # Stable sort once; everything below works on the sorted order
+    order = np.argsort(ts_int, kind="stable")
+    order = order[~invalid_time[order]]
+    ts_sorted = ts_int[order]
+
+    # Duplicates: keep the last occurrence of each timestamp
+    is_dup = np.zeros(len(order), dtype=bool)
+    if len(order) > 1:
+        is_dup[:-1] = ts_sorted[1:] == ts_sorted[:-1]
+    report["duplicate_timestamps"] = int(is_dup.sum())
+
+    keep = ~is_dup
+    bad_ohlc = np.zeros(len(order), dtype=bool)
+    if all(col in df.columns for col in PRICE_COLUMNS):
+        o, h, l, c = (df[col].to_numpy(dtype=float)[order] for col in PRICE_COLUMNS)
+        with np.errstate(invalid="ignore"):
+            bad_ohlc = (
+                (h < np.maximum(o, c))
+                | (l > np.minimum(o, c))
+                | (h < l)
+                | (np.minimum(np.minimum(o, h), np.minimum(l, c)) <= 0)
+            )
+        report["inconsistent_ohlc"] = int((bad_ohlc & keep).sum())
+        keep &= ~bad_ohlc
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = np.diff(np.log(c[keep]))
+        usable = np.isfinite(returns)
+        if sessions is not None:
+            # Jumps across session breaks are expected, only compare
+            # consecutive minute bars
+            usable &= np.diff(ts_sorted[keep]) == 60_000_000_000
+        returns = returns[usable]
+        if len(returns) > 1:
+            median = np.median(returns)
+            mad = np.median(np.abs(returns - median)) * 1.4826
+            if mad > 0:
+                report["price_outliers"] = int(
+                    (np.abs(returns - median) / mad > outlier_threshold).sum()
+                )
+            else:
+                report["price_outliers"] = 0
+        else:
+            report["price_outliers"] = 0
+
+    kept_ts = ts_sorted[keep]
+    if sessions is not None and len(kept_ts):
+        minutes = kept_ts // 60_000_000_000
+        minute_of_day = minutes % 1440
+        report["bars_outside_sessions"] = int(
+            (~_in_sessions(minute_of_day, sessions)).sum()
+        )
+        # A gap is a jump of more than one minute where the first missing
+        # minute should still have been inside a session
+        step = np.diff(minutes)
+        next_expected = (minute_of_day[:-1] + 1) % 1440
+        gaps = (step > 1) & _in_sessions(next_expected, sessions)
+        report["session_gaps"] = int(gaps.sum())
+        report["missing_session_bars"] = int(
+            (step[gaps] - 1).sum() if gaps.any() else 0
+        )
+
+    cleaned = df.iloc[order[keep]].reset_index(drop=True)
+    report["rows_out"] = len(cleaned)
+    return cleaned, report
+
+
+def check_coverage(dates, reference_dates, name=""):
+    """
+    Report dates of bar data that have no matching row in a daily reference
+    series (e.g. FX rates), which would otherwise be silently dropped by an
+    inner join.
+    """
+    dates = np.unique(np.asarray(dates, dtype="datetime64[D]"))
+    reference_dates = np.unique(np.asarray(reference_dates, dtype="datetime64[D]"))
+    missing = dates[~np.isin(dates, reference_dates)]
+    return {
+        "name": name,
+        "dates": len(dates),
+        "missing_dates": len(missing),
+        "first_missing": str(missing[0]) if len(missing) else None,
+    }
+
+
+def format_report(report):
+    """Format a validation report as a single compact line."""
+    name = report.get("name") or "data"
+    fields = ", ".join(f"{k}={v}" for k, v in report.items() if k != "name")
+    return f"[validate] {name}: {fields}"
+
+
+def load_validated(path, name="", sessions=None, verbose=True):
+    """
+    Read a CSV file and validate it with validate_bars.
+
+    Returns:
+        Tuple of (cleaned DataFrame, report dictionary)
+    """
+    df = pd.read_csv(path, encoding_errors="replace")
+    cleaned, report = validate_bars(df, name=name or path, sessions=sessions)
+    if verbose and _has_issues(report):
+        print(format_report(report))
+    return cleaned, report
+
+
+def _has_issues(report):
+    return any(
+        report.get(key)
+        for key in [
+            "invalid_timestamps",
+            "duplicate_timestamps",
+            "inconsistent_ohlc",
+            "price_outliers",
+            "session_gaps",
+            "bars_outside_sessions",
+            "missing_dates",
+        ]
+    ) or not report.get("monotonic", True)